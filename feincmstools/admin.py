@@ -1,11 +1,161 @@
+import json
+
+from django import forms
 from django.conf import settings
+from django.contrib.admin import helpers
+try:
+    from django.contrib.admin.utils import unquote
+except ImportError: # Django < 1.7
+    from django.contrib.admin.util import unquote
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.templatetags.admin_list import items_for_result
+from django.contrib.admin.views.main import IGNORED_PARAMS, PAGE_VAR, SEARCH_VAR
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import HttpResponse, Http404
+from django.shortcuts import get_object_or_404, render_to_response
+from django.template import RequestContext
+from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext as _
 
 from feincms.admin.item_editor import ItemEditor
-from feincms.admin.tree_editor import TreeEditor
+from feincms.admin.tree_editor import TreeEditor, ChangeList as TreeEditorChangeList
+
+from .signals import defer_content_changed, notify_content_changed
+from .utils import bulk_update
 
 class FeinCMSDocumentAdmin(ItemEditor):
 
+    # Only build inline formsets for the content types a document actually
+    # uses. The (empty) inline for any other type is fetched from
+    # inline/<content type>/ when an editor adds one.
+    lazy_inlines = False
+
+    # Write content that was only reordered or moved to another region with
+    # one UPDATE per content type, rather than saving each item.
+    bulk_content_save = False
+
+    @property
+    def media(self):
+        media = super(FeinCMSDocumentAdmin, self).media
+        if self.lazy_inlines:
+            media = media + forms.Media(js=('feincmstools/scripts.js',))
+        return media
+
+    def get_urls(self):
+        from django.conf.urls import url
+        info = self.model._meta.app_label, self.model._meta.object_name.lower()
+        return [
+            url(r'^inline/(\w+)/$',
+                self.admin_site.admin_view(self.inline_view),
+                name='%s_%s_inline' % info),
+        ] + super(FeinCMSDocumentAdmin, self).get_urls()
+
+    def get_feincms_inlines(self, model, request):
+        inlines = super(FeinCMSDocumentAdmin, self).get_feincms_inlines(model, request)
+        content_types = getattr(request, '_feincmstools_inline_types', None)
+        if content_types is not None:
+            inlines = [inline for inline in inlines if inline.model in content_types]
+        return inlines
+
+    def _get_inline_types(self, request, obj=None):
+        """
+        The content types which need a formset: those with content on ``obj``
+        and those submitted with the request.
+        """
+        all_types = self.model._feincms_content_types
+        content_types = set()
+        if obj is not None:
+            counts = obj.content._fetch_content_type_count_helper(obj.pk)
+            for region_counts in counts.values():
+                content_types.update(all_types[ct_idx] for pk, ct_idx in region_counts)
+        for content_type in all_types:
+            if '%s_set-TOTAL_FORMS' % content_type.__name__.lower() in request.POST:
+                content_types.add(content_type)
+        return content_types
+
+    def _add_admin_includes(self):
+        # Content types only add their admin templates to the item editor's
+        # head once an instance is made, which lazy inlines may never do
+        # before the head has been rendered.
+        for content_type in self.model._feincms_content_types:
+            if hasattr(content_type, '_add_admin_include'):
+                content_type._add_admin_include()
+
+    def add_view(self, request, *args, **kwargs):
+        if self.lazy_inlines:
+            self._add_admin_includes()
+            request._feincmstools_inline_types = self._get_inline_types(request)
+        return super(FeinCMSDocumentAdmin, self).add_view(request, *args, **kwargs)
+
+    def change_view(self, request, object_id, *args, **kwargs):
+        if self.lazy_inlines:
+            self._add_admin_includes()
+            obj = self.get_object(request, unquote(object_id))
+            request._feincmstools_inline_types = self._get_inline_types(request, obj)
+        return super(FeinCMSDocumentAdmin, self).change_view(
+            request, object_id, *args, **kwargs)
+
+    def changeform_view(self, *args, **kwargs):
+        # Saving the document itself counts as a change to it, so that
+        # handlers such as static publishing run once, after the content.
+        with defer_content_changed():
+            return super(FeinCMSDocumentAdmin, self).changeform_view(*args, **kwargs)
+
+    def save_related(self, request, form, formsets, change):
+        # content_changed is sent once for the document, not once per item.
+        with transaction.atomic():
+            with defer_content_changed():
+                super(FeinCMSDocumentAdmin, self).save_related(
+                    request, form, formsets, change)
+
+    def save_formset(self, request, form, formset, change):
+        if not (self.bulk_content_save
+                and hasattr(formset.model, '_feincms_content_class')):
+            return super(FeinCMSDocumentAdmin, self).save_formset(
+                request, form, formset, change)
+
+        instances = formset.save(commit=False)
+        position_fields = set(['region', 'ordering'])
+        moved = set(obj.pk for obj, changed in formset.changed_objects
+                    if set(changed) <= position_fields)
+        for obj in formset.deleted_objects:
+            obj.delete()
+        for obj in instances:
+            if obj.pk not in moved:
+                obj.save()
+        formset.save_m2m()
+        moved = [obj for obj in instances if obj.pk in moved]
+        if moved:
+            bulk_update(formset.model, moved, position_fields)
+            notify_content_changed(formset.model._feincms_content_class,
+                                   formset.instance.pk)
+
+    def inline_view(self, request, content_type_name):
+        """
+        Render the empty inline formset for one content type, for the item
+        editor to insert when that content type is first added.
+        """
+        if not (self.has_add_permission(request) or self.has_change_permission(request)):
+            raise PermissionDenied
+        inlines = [inline for inline in self.get_feincms_inlines(self.model, request)
+                   if inline.model.__name__.lower() == content_type_name]
+        if not inlines:
+            raise Http404
+        inline = inlines[0](self.model, self.admin_site)
+        FormSet = inline.get_formset(request, None)
+        formset = FormSet(instance=self.model(), prefix=FormSet.get_default_prefix(),
+                          queryset=inline.model._default_manager.none())
+        inline_admin_formset = helpers.InlineAdminFormSet(
+            inline, formset,
+            list(inline.get_fieldsets(request, None)),
+            inline.get_prepopulated_fields(request, None),
+            list(inline.get_readonly_fields(request, None)),
+            model_admin=self)
+        return render_to_response(inline.template, {
+            'inline_admin_formset': inline_admin_formset,
+        }, context_instance=RequestContext(request))
+
     def get_template_list(self):
         opts = self.model._meta
         return [
@@ -14,9 +164,139 @@ class FeinCMSDocumentAdmin(ItemEditor):
             'admin/%s/item_editor.html' % opts.app_label
             ] + super(FeinCMSDocumentAdmin, self).get_template_list()
 
+class HierarchicalChangeList(TreeEditorChangeList):
+    """
+    Computes the view-on-site URLs for a whole page of results at once, with a
+    single ancestor query, before any row is rendered.
+    """
+
+    def get_results(self, request):
+        super(HierarchicalChangeList, self).get_results(request)
+        self.model_admin.prepare_rows(self.result_list)
+
+
 class HierarchicalFeinCMSDocumentAdmin(FeinCMSDocumentAdmin, TreeEditor):
     raw_id_fields = ('parent',)
 
+    # For large trees: render only the top ``lazy_tree_levels`` levels of the
+    # changelist and load children on demand, ``lazy_tree_page_size`` at a time.
+    lazy_tree = False
+    lazy_tree_levels = 1
+    lazy_tree_page_size = 100
+
+    def __init__(self, *args, **kwargs):
+        super(HierarchicalFeinCMSDocumentAdmin, self).__init__(*args, **kwargs)
+        if self.lazy_tree:
+            self.list_per_page = self.lazy_tree_page_size
+
+    @property
+    def media(self):
+        media = super(HierarchicalFeinCMSDocumentAdmin, self).media
+        if self.lazy_tree:
+            media = media + forms.Media(
+                js=('feincmstools/scripts.js',),
+                css={'all': ('feincmstools/styles.css',)})
+        return media
+
+    def get_urls(self):
+        from django.conf.urls import url
+        info = self.model._meta.app_label, self.model._meta.object_name.lower()
+        return [
+            url(r'^(.+)/children/$',
+                self.admin_site.admin_view(self.children_view),
+                name='%s_%s_children' % info),
+        ] + super(HierarchicalFeinCMSDocumentAdmin, self).get_urls()
+
+    def get_queryset(self, request):
+        qs = super(HierarchicalFeinCMSDocumentAdmin, self).get_queryset(request)
+        if getattr(request, '_feincmstools_lazy_tree', False):
+            qs = qs.filter(level__lt=self.lazy_tree_levels)
+        parent = getattr(request, '_feincmstools_lazy_parent', None)
+        if parent is not None:
+            qs = qs.filter(parent=parent)
+        return qs
+
+    def changelist_view(self, request, *args, **kwargs):
+        # Only trim the tree for plain page views; actions, AJAX commands,
+        # searches and filtered lists still see every node.
+        lookups = [key for key in request.GET
+                   if key not in IGNORED_PARAMS and key != PAGE_VAR]
+        if self.lazy_tree and request.method == 'GET' and not request.is_ajax() \
+                and not request.GET.get(SEARCH_VAR) and not lookups:
+            request._feincmstools_lazy_tree = True
+        return super(HierarchicalFeinCMSDocumentAdmin, self).changelist_view(
+            request, *args, **kwargs)
+
+    def get_changelist(self, request, **kwargs):
+        return HierarchicalChangeList
+
+    def prepare_rows(self, items):
+        """
+        Precompute the absolute URL of each of ``items`` for the changelist.
+        """
+        items = list(items)
+        if hasattr(self.model, 'prefetch_ancestors'):
+            self.model.prefetch_ancestors(items)
+        if hasattr(self.model, 'get_absolute_url'):
+            for item in items:
+                item._feincmstools_absolute_url = item.get_absolute_url()
+
+    def children_view(self, request, object_id):
+        """
+        JSON list of the changelist rows of the children of a node, for the
+        lazy tree changelist.
+        """
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        parent = get_object_or_404(self.get_queryset(request), pk=unquote(object_id))
+        request._feincmstools_lazy_parent = parent
+
+        # Build the rows the way changelist_view does, so that they have the
+        # same columns (action checkbox included) as the rest of the list.
+        if 'actions_column' not in self.list_display:
+            self.list_display.append('actions_column')
+        self._refresh_changelist_caches()
+        list_display = self.get_list_display(request)
+        list_display_links = self.get_list_display_links(request, list_display)
+        if self.get_actions(request):
+            list_display = ['action_checkbox'] + list(list_display)
+        ChangeList = self.get_changelist(request)
+        try:
+            cl = ChangeList(request, self.model, list_display,
+                list_display_links, self.get_list_filter(request),
+                self.date_hierarchy, self.get_search_fields(request),
+                self.list_select_related, self.lazy_tree_page_size,
+                self.list_max_show_all, self.list_editable, self)
+        except IncorrectLookupParameters:
+            raise Http404
+
+        rows = []
+        for item in cl.result_list:
+            # FEINCMS_TREE_EDITOR_INCLUDE_ANCESTORS adds the ancestors too.
+            if item.parent_id != parent.pk:
+                continue
+            rows.append({
+                'pk': item.pk,
+                'html': u'<tr>%s</tr>' % u''.join(items_for_result(cl, item, None)),
+            })
+        data = {
+            'rows': rows,
+            'next_page': cl.page_num + 1 if cl.page_num + 1 < cl.paginator.num_pages else None,
+            'more_label': _('More...'),
+        }
+        return HttpResponse(json.dumps(data), content_type='application/json')
+
+    def indented_short_title(self, item):
+        r = super(HierarchicalFeinCMSDocumentAdmin, self).indented_short_title(item)
+        if self.lazy_tree and item.level >= self.lazy_tree_levels - 1 \
+                and not item.is_leaf_node():
+            r = mark_safe(
+                u'<span class="lazy-tree-toggle" data-pk="%s"'
+                u' data-url="%s/children/"></span>%s' % (item.pk, item.pk, r))
+        return r
+    indented_short_title.short_description = TreeEditor.indented_short_title.short_description
+    indented_short_title.allow_tags = True
+
     def _actions_column(self, content):
         actions = super(HierarchicalFeinCMSDocumentAdmin, self)._actions_column(
             content)
@@ -30,10 +310,12 @@ class HierarchicalFeinCMSDocumentAdmin(FeinCMSDocumentAdmin, TreeEditor):
 
         )
         if hasattr(content, 'get_absolute_url'):
+            url = getattr(content, '_feincmstools_absolute_url', None) \
+                or content.get_absolute_url()
             actions.insert(0,
                            u'<a href="%s" title="%s">' \
                            u'<img src="%simg/selector-search.gif" alt="%s" /></a>' % (
-                               content.get_absolute_url(),
+                               url,
                                _('View on site'),
                                settings.STATIC_URL+"/admin/",
                                _('View on site'))
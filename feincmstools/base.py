@@ -1,26 +1,68 @@
 # -*- coding: utf-8 -*-
 
 from collections import defaultdict
+import operator
 import sys
+import urlparse
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.base import ModelState
 from django.http import HttpRequest
 from django.utils.datastructures import SortedDict
 from django.utils.translation import ugettext_lazy as _
 
-from feincms.models import create_base_model
+from feincms.models import ContentProxy, create_base_model
 from mptt.models import MPTTModel, MPTTModelBase
 
 from django.template.loader import render_to_string, get_template
 from django.template.context import RequestContext, Context
 from django.template import TemplateDoesNotExist, Template
 
+from .mixins import HierarchicalSlug
 from .models import create_content_types
+from . import conditional
+from . import inheritance
+from . import navigation
+from . import publishing
+from . import registry
+from . import routers
 from . import settings as feincmstools_settings
+from .signals import notify_content_changed
+from .utils import bulk_update
 
 
 __all__ = ['FeinCMSDocument', 'FeinCMSDocumentBase', 'HierarchicalFeinCMSDocument', 'Content']
 
+def _from_values(model, values):
+    # An instance of ``model`` with the field values ``values`` (as returned by
+    # ``values()``), made without calling __init__.
+    instance = model.__new__(model)
+    instance.__dict__.update(values)
+    instance._state = ModelState()
+    return instance
+
+
+def _clone_m2m(model, pks):
+    """
+    Copy the many-to-many relations of instances of ``model`` to their
+    copies, with ``pks`` mapping the primary keys of the originals to those of
+    the copies. ``bulk_create`` leaves them out.
+    """
+    for field in model._meta.many_to_many:
+        through = field.rel.through
+        from_name = '%s_id' % field.m2m_field_name()
+        pk_name = through._meta.pk.attname
+        rows = []
+        for values in through._default_manager.filter(**{
+                '%s__in' % from_name: list(pks)}).order_by(pk_name).values():
+            values[pk_name] = None
+            values[from_name] = pks[values[from_name]]
+            rows.append(_from_values(through, values))
+        if rows:
+            through._default_manager.bulk_create(rows)
+
+
 # --- Models that use FeinCMS Content ------------------------------------------------------------
 
 class FeinCMSDocumentBase(models.base.ModelBase):
@@ -31,8 +73,50 @@ class FeinCMSDocumentBase(models.base.ModelBase):
     def __new__(mcs, name, bases, attrs):
         new_class = super(FeinCMSDocumentBase, mcs).__new__(mcs, name, bases, attrs)
         new_class._register()
+        if not new_class._meta.abstract:
+            routers.connect_signals(new_class)
+            if new_class.conditional_get:
+                conditional.connect_signals(new_class)
+            if new_class.publish_static:
+                publishing.connect_signals(new_class)
         return new_class
 
+class DocumentContentProxy(ContentProxy):
+    """
+    Fetches content from the read database while rendering; see
+    :py:mod:`feincmstools.routers`.
+    """
+
+    def _get_db(self):
+        return routers.get_read_database() or self._db
+
+    def _set_db(self, db):
+        self._db = db
+
+    db = property(_get_db, _set_db)
+
+class HierarchicalContentProxy(DocumentContentProxy):
+    """
+    Fills empty inherited regions from all ancestors with a single query
+    rather than one per ancestor; see :py:mod:`feincmstools.inheritance`.
+    Proxies which override ``_inherit_from()`` inherit the FeinCMS way.
+    """
+
+    def _fetch_content_type_counts(self):
+        if type(self)._inherit_from.im_func is not ContentProxy._inherit_from.im_func:
+            return super(HierarchicalContentProxy, self)._fetch_content_type_counts()
+        if 'counts' not in self._cache:
+            counts = self._fetch_content_type_count_helper(self.item.pk)
+            inherited = [region.key for region in self.item.template.regions
+                         if region.inherited]
+            if self.item.parent_id and any(not counts.get(key) for key in inherited):
+                inherited_counts = inheritance.get_inherited_counts(self, inherited)
+                for key in inherited:
+                    if not counts.get(key) and key in inherited_counts:
+                        counts[key] = inherited_counts[key]
+            self._cache['counts'] = counts
+        return self._cache['counts']
+
 class FeinCMSDocument(create_base_model()):
     """
     A model which can have FeinCMS content chunks attached to it.
@@ -92,6 +176,9 @@ class FeinCMSDocument(create_base_model()):
     # PUBLIC
     feincms_templates = None
     feincms_regions = None
+    content_proxy_class = DocumentContentProxy
+    publish_static = False # See feincmstools.publishing
+    conditional_get = False # See feincmstools.conditional
 
     class Meta:
         abstract = True
@@ -179,25 +266,112 @@ class FeinCMSDocument(create_base_model()):
         :return: All Content models used by the class. Useful for migrations.
         :rtype: ``set``
         """
-        lxr = cls._get_content_types_by_region()
-
+        if registry.is_registered(cls):
+            return set(registry.get_used_content_types(cls))
         r = set()
-
-        for reg, categories in lxr:
+        for reg, categories in cls._get_content_types_by_region():
             for category, types in categories:
-                r = r.union(types)
+                r.update(types)
         return r
 
+    def clone(self, **attrs):
+        """
+        Save and return a copy of this document with copies of all its
+        content, in the same regions and order. ``attrs`` are set on the copy
+        before it is saved; override ``_prepare_clone`` for anything else that
+        must differ, such as a unique slug.
+
+        Content is copied with one ``bulk_create`` per content type, so its
+        ``save()`` is not called and it sends no ``post_save``. Many-to-many
+        relations of the document and of its content are copied too.
+        """
+        with transaction.atomic():
+            clone = self._copy_for_clone(attrs)
+            clone.save()
+            _clone_m2m(type(self), {self.pk: clone.pk})
+            self._clone_content({self.pk: clone.pk})
+        return clone
+
+    def get_publish_path(self):
+        """
+        Where a static copy of the document is stored, relative to
+        ``FEINCMSTOOLS_PUBLISH_ROOT``. Defaults to the path of its URL.
+        """
+        return urlparse.urlsplit(self.get_absolute_url()).path.strip('/')
+
+    def get_last_modified(self):
+        """
+        When the document or its content last changed, as a ``datetime``, or
+        ``None`` if that is not known. Override this if you can tell; the
+        ``publish_documents`` command uses it to find out-of-date pages, and
+        :py:mod:`feincmstools.conditional` for ``Last-Modified``.
+        """
+        return None
+
+    def _prepare_clone(self, original):
+        """
+        Called on each copy of ``original`` made by ``clone()``, before it is
+        saved.
+        """
+        pass
+
     #PRIVATE
 
     __metaclass__ = FeinCMSDocumentBase
 
+    def _copy_for_clone(self, attrs):
+        # Built from field values rather than copied, so that nothing cached
+        # on self (content, ancestors, related objects) carries over.
+        opts = self._meta
+        clone = type(self)(**dict(
+            (field.attname, getattr(self, field.attname))
+            for field in opts.concrete_fields if field is not opts.pk))
+        for name, value in attrs.items():
+            setattr(clone, name, value)
+        clone._prepare_clone(self)
+        return clone
+
+    @classmethod
+    def _clone_content(cls, pks):
+        """
+        Copy the content of documents to other documents, with ``pks`` mapping
+        the primary keys of the originals to those of their copies.
+        """
+        for content_type in cls._feincms_content_types:
+            pk_name = content_type._meta.pk.attname
+            items = []
+            originals = defaultdict(list) # original parent -> original pks
+            for values in content_type._default_manager.filter(
+                    parent__in=pks.keys()).order_by('pk').values():
+                originals[values['parent_id']].append(values[pk_name])
+                values[pk_name] = None
+                values['parent_id'] = pks[values['parent_id']]
+                items.append(_from_values(content_type, values))
+            if not items:
+                continue
+            content_type._default_manager.bulk_create(items)
+            if content_type._meta.many_to_many:
+                # Not every database returns the new primary keys, but the
+                # copies were inserted in the order of the originals.
+                copies = defaultdict(list)
+                for parent_id, pk in content_type._default_manager.filter(
+                        parent__in=pks.values()).order_by('pk').values_list(
+                        'parent_id', 'pk'):
+                    copies[parent_id].append(pk)
+                _clone_m2m(content_type, dict(
+                    pair for parent_id, original_pks in originals.items()
+                    for pair in zip(original_pks, copies[pks[parent_id]])))
+        for pk in pks.values():
+            notify_content_changed(cls, pk)
+
     @classmethod
     def _get_content_types_by_region(cls):
         """
         :return: All content_types grouped by category, then into regions.
         :rtype: ``list`` of ``tuple``s
         """
+        if registry.is_registered(cls):
+            return registry.get_types_by_region(cls)
         return [(r.key, cls.content_types_by_region(r.key)) for r in cls._feincms_all_regions]
 
 
@@ -244,7 +418,17 @@ class FeinCMSDocument(create_base_model()):
         return template.render(context)
 
 class HierarchicalFeinCMSDocumentBase(FeinCMSDocumentBase, MPTTModelBase):
-    pass
+    """
+    Also keeps cached navigation trees and inherited content up to date for
+    each new class.
+    """
+
+    def __new__(mcs, name, bases, attrs):
+        new_class = super(HierarchicalFeinCMSDocumentBase, mcs).__new__(mcs, name, bases, attrs)
+        if not new_class._meta.abstract:
+            navigation.connect_signals(new_class)
+            inheritance.connect_signals(new_class)
+        return new_class
 
 class HierarchicalFeinCMSDocument(FeinCMSDocument, MPTTModel):
     """
@@ -259,20 +443,151 @@ class HierarchicalFeinCMSDocument(FeinCMSDocument, MPTTModel):
                                null=True, related_name='children')
     parent.parent_filter = True # Custom FeinCMS list_filter - see admin/filterspecs.py
 
+    content_proxy_class = HierarchicalContentProxy
 
     class Meta:
         abstract = True
         ordering = ['tree_id', 'lft'] # required for FeinCMS TreeEditor
 
+    def get_publish_path(self):
+        return self.get_path()
+
     def get_path(self):
         """ Returns list of slugs from tree root to self. """
         # TODO: cache in database for efficiency?
-        page_list = list(self.get_ancestors()) + [self]
+        ancestors = getattr(self, '_prefetched_ancestors', None)
+        if ancestors is None:
+            ancestors = list(self.get_ancestors())
+        page_list = ancestors + [self]
         return '/'.join([page.slug for page in page_list])
 
+    def clone(self, descendants=False, **attrs):
+        """
+        As ``FeinCMSDocument.clone()``. With ``descendants=True`` the whole
+        subtree is copied, and inserted as the last child of the copy's
+        ``parent`` (by default the original's parent). The copies are saved
+        with one ``bulk_create``, with their MPTT fields worked out in memory,
+        so their ``save()`` is not called either; hierarchical slugs are
+        recalculated for the new subtree.
+        """
+        attrs = dict(attrs)
+        if 'parent' in attrs:
+            parent = attrs.pop('parent')
+            attrs['parent_id'] = parent.pk if parent else None
+        parent_id = attrs.get('parent_id', self.parent_id)
+        if not descendants:
+            # Without tree fields MPTT inserts the copy as a new node.
+            attrs = dict(attrs, parent_id=parent_id, lft=None, rght=None)
+            return super(HierarchicalFeinCMSDocument, self).clone(**attrs)
+        cls = type(self)
+        manager = cls._tree_manager
+        with transaction.atomic():
+            # Tree fields may have changed since self was loaded.
+            root = cls._default_manager.get(pk=self.pk)
+            originals = [root] + list(root.get_descendants())
+            size = root.rght - root.lft + 1
+            if parent_id:
+                parent = cls._default_manager.get(pk=parent_id)
+                manager._create_space(size, parent.rght - 1, parent.tree_id)
+                tree_id = parent.tree_id
+                offset = parent.rght - root.lft
+                level_offset = parent.level + 1 - root.level
+            else:
+                tree_id = manager._get_next_tree_id()
+                offset = 1 - root.lft
+                level_offset = -root.level
+
+            clones = []
+            for original in originals:
+                clone_attrs = attrs if original is root else {}
+                clone_attrs = dict(clone_attrs,
+                    tree_id=tree_id,
+                    lft=original.lft + offset,
+                    rght=original.rght + offset,
+                    level=original.level + level_offset,
+                    # Descendants get their parents once they have pks.
+                    parent_id=parent_id if original is root else None)
+                # The root is copied from self, with any unsaved changes.
+                source = self if original is root else original
+                clones.append(source._copy_for_clone(clone_attrs))
+            cls._default_manager.bulk_create(clones)
+
+            # Not every database returns the new primary keys, but lft is
+            # unique within the new subtree.
+            new_pks = dict(cls._default_manager.filter(
+                tree_id=tree_id, lft__gte=root.lft + offset,
+                rght__lte=root.rght + offset).values_list('lft', 'pk'))
+            lfts = dict((original.pk, original.lft) for original in originals)
+            for original, clone in zip(originals, clones):
+                clone.pk = new_pks[clone.lft]
+                if original is not root:
+                    clone.parent_id = new_pks[lfts[original.parent_id] + offset]
+            bulk_update(cls, clones[1:], ['parent'])
+            for clone in clones:
+                clone._mptt_meta.update_mptt_cached_fields(clone)
+            if isinstance(root, HierarchicalSlug):
+                # The copies still have the old subtree's paths.
+                cls.rebuild_slugs(root=clones[0])
+
+            pks = dict((original.pk, clone.pk) for original, clone in zip(originals, clones))
+            _clone_m2m(cls, pks)
+            cls._clone_content(pks)
+        navigation.invalidate_navigation(cls)
+        return clones[0]
+
+    @classmethod
+    def prefetch_ancestors(cls, nodes):
+        """
+        Fetch the ancestors of all ``nodes`` in (at most) one query, and keep
+        them on each node for ``get_path()``. Ancestors that are among
+        ``nodes`` themselves are not fetched again.
+        """
+        nodes = list(nodes)
+        by_pk = dict((node.pk, node) for node in nodes)
+        # Nodes whose parent is not in the list need their ancestors fetched.
+        # One node per parent is enough, as siblings share their ancestors.
+        frontier = dict((node.parent_id, node) for node in nodes
+                        if node.parent_id and node.parent_id not in by_pk)
+        if frontier:
+            query = reduce(operator.or_, [
+                models.Q(tree_id=node.tree_id, lft__lt=node.lft, rght__gt=node.rght)
+                for node in frontier.values()])
+            for ancestor in cls._default_manager.filter(query):
+                by_pk.setdefault(ancestor.pk, ancestor)
+        for node in nodes:
+            ancestors = []
+            parent = by_pk.get(node.parent_id)
+            while parent is not None:
+                ancestors.append(parent)
+                parent = by_pk.get(parent.parent_id)
+            ancestors.reverse()
+            node._prefetched_ancestors = ancestors
+        return nodes
+
 
 #-------------------------------------------------------------------------------
 
+_template_paths = {} # (kind, content type[, region]) -> template path or None
+
+def _cached_template(key, paths):
+    """
+    The first of ``paths`` that exists, remembered per content type (and
+    region) unless ``DEBUG`` is on.
+    """
+    try:
+        return _template_paths[key]
+    except KeyError:
+        pass
+    path = None
+    for p in paths:
+        if Content._detect_template(p):
+            path = p
+            break
+    if not settings.DEBUG:
+        _template_paths[key] = path
+    return path
+
+
 class Content(models.Model):
     """
     A feincms content type that uses a template
@@ -298,40 +613,116 @@ class Content(models.Model):
     admin_template = None # For initialisation in the admin
     render_template = None # For rendering on the front end
 
+    # Set to True for content types whose extra_context/rendering is I/O
+    # bound, to render them on a worker thread in feincmstools_render_region.
+    render_concurrently = False
+    render_timeout = None # Seconds; defaults to FEINCMSTOOLS_RENDER_TIMEOUT
+
+    #: Field names which are enough to render this content type, for
+    #: ``render_region(..., lightweight=True)``; see
+    #: :py:mod:`feincmstools.lightweight`. ``None`` means it always needs full
+    #: model instances.
+    render_fields = None
+
     def render(self, **kwargs):
         template = self.render_template or self._find_render_template_path(self.region)
+        return self._render_with_template(self, template, **kwargs)
+
+    @classmethod
+    def _render_with_template(cls, content, template, **kwargs):
+        """
+        Render ``content`` -- an instance of ``cls``, or a lightweight proxy
+        for one -- with ``template``.
+        """
         if not template:
             raise NotImplementedError(
                 'No template found for rendering %s content. I tried ["%s"].' % (
-                    self.__class__.__name__,
-                    '", "'.join(self._render_template_paths(self.region))
+                    cls.__name__,
+                    '", "'.join(cls._render_template_paths(content.region))
                 )
             )
         # Request is required, throw a KeyError if it's not there
         request = kwargs['request']
         context = kwargs.get('context', {})
-        context['content'] = self
-        if hasattr(self, 'extra_context') and callable(self.extra_context):
-            context.update(self.extra_context(request))
+        context['content'] = content
+        if hasattr(content, 'bulk_extra_context'):
+            context.update(content._get_bulk_extra_context(request))
+        if hasattr(content, 'extra_context') and callable(content.extra_context):
+            context.update(content.extra_context(request))
         if hasattr(context, 'flatten'):
             # render_to_string expects a dictionary, not a context, this is
             # more strictly enforced in Django 1.8
             context = context.flatten()
         return render_to_string(template, context, context_instance=RequestContext(request))
 
+    @classmethod
+    def prepare_bulk_extra_context(cls, contents, request):
+        """
+        Call the optional ``bulk_extra_context`` classmethod once for all
+        items of this content type in ``contents``, and keep each item's
+        context for ``render()``.
+
+        Content types that define it look like this:
+
+            @classmethod
+            def bulk_extra_context(cls, contents, request):
+                articles = Article.objects.in_bulk([c.article_id for c in contents])
+                return dict((c.pk, {'article': articles.get(c.article_id)}) for c in contents)
+
+        i.e. it returns a dictionary mapping each item's pk to the extra
+        context for that item. ``contents`` are the instances FeinCMS has
+        already fetched, through ``get_queryset`` if the content type
+        overrides it.
+        """
+        contents = [c for c in contents if type(c) is cls]
+        if contents:
+            contexts = cls.bulk_extra_context(contents, request) or {}
+            for content in contents:
+                content._bulk_extra_context = (request, contexts.get(content.pk, {}))
+
+    def _get_bulk_extra_context(self, request):
+        cached = getattr(self, '_bulk_extra_context', None)
+        if cached is None or cached[0] is not request:
+            # Prepare all items of this type in the region at once.
+            siblings = getattr(self.parent.content, self.region)
+            # Compared by identity: an item fetched on its own is equal to,
+            # but not the same as, the one in a fresh content proxy.
+            if not any(sibling is self for sibling in siblings):
+                siblings = [self]
+            type(self).prepare_bulk_extra_context(siblings, request)
+        return self._bulk_extra_context[1]
+
+    def render_fallback(self, **kwargs):
+        """
+        Output used in place of ``render()`` when concurrent rendering
+        times out. See :py:mod:`feincmstools.rendering`.
+        """
+        return u''
+
     def __init__(self, *args, **kwargs):
         super(Content, self).__init__(*args, **kwargs)
         if not hasattr(self, '__templates_initialised'):
-            parent_class = getattr(self, '_feincms_content_class', None)
             self.render_template = self.render_template or self._find_render_template_path(self.region)
-            self.admin_template = self.admin_template or self._find_admin_template_path()
-            if parent_class and self.admin_template:
-                if not hasattr(parent_class, 'feincms_item_editor_includes'):
-                    setattr(parent_class, 'feincms_item_editor_includes', {})
-                parent_class.feincms_item_editor_includes.setdefault('head', set()).add(self.admin_template)
+            self.admin_template = self._add_admin_include()
 
         self.__templates_initialised = True
 
+    @classmethod
+    def _add_admin_include(cls):
+        """
+        Add this content type's admin template, if it has one, to the item
+        editor ``head`` includes of its document, and return it. Instances
+        do this when they are created; the admin calls it for content types
+        it has no instances of yet.
+        """
+        admin_template = cls.admin_template or cls._find_admin_template_path()
+        parent_class = getattr(cls, '_feincms_content_class', None)
+        if parent_class and admin_template:
+            if not hasattr(parent_class, 'feincms_item_editor_includes'):
+                setattr(parent_class, 'feincms_item_editor_includes', {})
+            parent_class.feincms_item_editor_includes.setdefault('head', set()).add(admin_template)
+        return admin_template
+
 
     @staticmethod
     def _template_params(klass, base, region=None):
@@ -367,19 +758,20 @@ class Content(models.Model):
                 for x in Content._bases_that_are_content_types(base):
                     yield x
 
-    def _admin_template_paths(self):
+    @classmethod
+    def _admin_template_paths(cls):
         pt= "content_types/%(content_type_defining_app)s/%(content_model_name)s/admin_init.html"
-        klass = type(self) #the concrete model
+        klass = cls #the concrete model
         for base in Content._bases_that_are_content_types(klass):
             path = pt % Content._template_params(klass, base)
             yield path
 
-    def _find_admin_template_path(self):
-        for p in self._admin_template_paths():
-            if Content._detect_template(p):
-                return p
+    @classmethod
+    def _find_admin_template_path(cls):
+        return _cached_template(('admin', cls), cls._admin_template_paths())
 
-    def _render_template_paths(self, region):
+    @classmethod
+    def _render_template_paths(cls, region):
         """
         Return
         content_types/[content_type_defining_app]/[content_model]/[content_type_using_app]_[content_type_using_model]_[region_name].html
@@ -395,7 +787,7 @@ class Content(models.Model):
         pt3= "content_types/%(content_type_defining_app)s/%(content_model_name)s/%(content_type_using_region)s.html"
         pt4= "content_types/%(content_type_defining_app)s/%(content_model_name)s/render.html"
 
-        klass = type(self) #the concrete model
+        klass = cls #the concrete model
         for base in Content._bases_that_are_content_types(klass):
             params = Content._template_params(klass, base, region)
             yield pt1 % params
@@ -403,10 +795,9 @@ class Content(models.Model):
             yield pt3 % params
             yield pt4 % params
 
-    def _find_render_template_path(self, region):
-        for p in self._render_template_paths(region):
-            if Content._detect_template(p):
-                return p
+    @classmethod
+    def _find_render_template_path(cls, region):
+        return _cached_template(('render', cls, region), cls._render_template_paths(region))
 
     @staticmethod
     def _detect_template(path):
@@ -0,0 +1,170 @@
+"""
+Conditional GET for documents of models with ``conditional_get = True``.
+
+Content tables have no modification times, so instead each document has a
+version in the cache: the time (in milliseconds) it, or any of its content,
+was last saved or deleted, as reported by ``post_save`` and
+``content_changed``. Working out the ``ETag`` and ``Last-Modified`` of a page
+therefore costs a couple of cache lookups rather than a query per content
+type, and unchanged pages are answered with ``304 Not Modified`` before
+anything is rendered::
+
+    def get_page(request, path):
+        return Page.objects.get(...)
+
+    @condition_on_document(get_page)
+    def page_view(request, path):
+        page = request.feincmstools_document
+        ...
+
+For hierarchical documents the versions of the model's navigation tree and,
+if the template has inherited regions, of the ancestors (one query for their
+keys, unless they were prefetched) are taken into account too.
+"""
+
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import navigation
+from .signals import content_changed
+from .utils import model_cache_key, get_cache_versions, bump_cache_version
+
+CACHE_PREFIX = 'feincmstools:version'
+
+
+def _key(model, pk):
+    return '%s:%s' % (model_cache_key(CACHE_PREFIX, model), pk)
+
+
+def bump_version(model, pk):
+    """
+    Record that the document of class ``model`` with primary key ``pk`` has
+    changed.
+    """
+    bump_cache_version(_key(model, pk))
+
+
+def get_versions(model, pks):
+    """
+    :return: A ``dict`` of the versions of the documents of ``model`` with
+             primary keys ``pks``. Documents without a version (e.g. after
+             the cache was cleared) get one now.
+    """
+    keys = dict((_key(model, pk), pk) for pk in pks)
+    versions = get_cache_versions(list(keys))
+    return dict((keys[key], version) for key, version in versions.items())
+
+
+def get_document_versions(document):
+    """
+    :return: All versions that the rendering of ``document`` depends on.
+    :rtype: ``list`` of ``int``
+    """
+    model = type(document)
+    pks = [document.pk]
+    versions = []
+    if hasattr(document, 'get_ancestors'):
+        if any(region.inherited for region in document.template.regions):
+            ancestors = getattr(document, '_prefetched_ancestors', None)
+            if ancestors is not None:
+                pks.extend(ancestor.pk for ancestor in ancestors)
+            else:
+                pks.extend(document.get_ancestors().values_list('pk', flat=True))
+        versions.append(navigation.get_navigation_version(model))
+    by_pk = get_versions(model, pks)
+    return [by_pk[pk] for pk in pks] + versions
+
+
+def get_etag(document, versions=None):
+    if versions is None:
+        versions = get_document_versions(document)
+    return '%s.%s-%s-%s' % (document._meta.app_label, document._meta.object_name.lower(),
+                            document.pk, '-'.join(str(version) for version in versions))
+
+
+def get_last_modified(document, versions=None):
+    """
+    When ``document`` (or anything else it depends on) last changed, as a
+    naive UTC ``datetime``. ``document.get_last_modified()`` is used too, if
+    it returns something more recent.
+    """
+    if versions is None:
+        versions = get_document_versions(document)
+    last_modified = datetime.utcfromtimestamp(max(versions) / 1000.0)
+    own = document.get_last_modified()
+    if own is not None:
+        if timezone.is_aware(own):
+            own = timezone.make_naive(own, timezone.utc)
+        last_modified = max(last_modified, own)
+    return last_modified
+
+
+def condition_on_document(get_document):
+    """
+    View decorator adding ``ETag`` and ``Last-Modified`` headers for the
+    document returned by ``get_document(request, *args, **kwargs)``, and
+    answering conditional requests for it with 304 without calling the view.
+    The document is available to the view as
+    ``request.feincmstools_document``. If ``get_document`` returns ``None``,
+    the view is called as usual.
+
+    Versions are bumped in the process that saves the document, so the
+    default cache must be shared by all processes.
+    """
+    if settings.CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+        raise ImproperlyConfigured(
+            'condition_on_document needs a cache shared by all processes, '
+            'not the local-memory cache.')
+    def decorator(view):
+        def _document(request, *args, **kwargs):
+            if not hasattr(request, 'feincmstools_document'):
+                document = get_document(request, *args, **kwargs)
+                if document is not None and not getattr(document, 'conditional_get', False):
+                    # Without the flag its version is never bumped.
+                    raise ImproperlyConfigured(
+                        '%s needs conditional_get = True to be used with '
+                        'condition_on_document.' % type(document).__name__)
+                request.feincmstools_document = document
+                request._feincmstools_versions = (
+                    document and get_document_versions(document))
+            return request.feincmstools_document, request._feincmstools_versions
+
+        def etag(request, *args, **kwargs):
+            document, versions = _document(request, *args, **kwargs)
+            if document is not None:
+                return get_etag(document, versions)
+
+        def last_modified(request, *args, **kwargs):
+            document, versions = _document(request, *args, **kwargs)
+            if document is not None:
+                return get_last_modified(document, versions)
+
+        return wraps(view)(condition(etag_func=etag, last_modified_func=last_modified)(view))
+    return decorator
+
+
+def _content_changed(sender, pk, **kwargs):
+    if getattr(sender, 'conditional_get', False):
+        bump_version(sender, pk)
+
+content_changed.connect(_content_changed, dispatch_uid='feincmstools:conditional')
+
+
+def _document_changed(sender, instance, **kwargs):
+    bump_version(sender, instance.pk)
+
+
+def connect_signals(model):
+    """
+    Bump document versions when documents of ``model`` are saved or deleted.
+    Called for every concrete FeinCMSDocument with ``conditional_get = True``.
+    """
+    uid = 'feincmstools:conditional:%s.%s' % (model.__module__, model.__name__)
+    post_save.connect(_document_changed, sender=model, dispatch_uid=uid)
+    post_delete.connect(_document_changed, sender=model, dispatch_uid=uid)
@@ -7,19 +7,37 @@ from feincms.admin.item_editor import ItemEditorForm
 from warnings import warn
 
 
+# Admin widgets are built once per (model, field) and shared between form
+# classes; forms deep-copy their fields' widgets on instantiation anyway.
+_admin_widgets = {}
+
+
+def _get_admin_widget(model, field_name, widget_class):
+    key = (model, field_name, widget_class)
+    if key not in _admin_widgets:
+        if widget_class is ForeignKeyRawIdWidget:
+            widget = ForeignKeyRawIdWidget(
+                rel=model._meta.get_field(field_name).rel,
+                admin_site=admin.site
+            )
+        else:
+            widget = FilteredSelectMultiple(field_name, 0)
+        _admin_widgets[key] = widget
+    return _admin_widgets[key]
+
+
 class FormWithAdminFeatures(ItemEditorForm):
     def __init__(self, *args, **kwargs):
-        if getattr(self, 'raw_id_fields', None):
-            for field_name in self.raw_id_fields:
-                self.base_fields[field_name].widget = ForeignKeyRawIdWidget(
-                    rel=self._meta.model._meta.get_field(field_name).rel,
-                    admin_site=admin.site
-                )
-        if getattr(self, 'filter_horizontal', None):
-            for field_name in self.filter_horizontal:
-                self.base_fields[field_name].widget = FilteredSelectMultiple(
-                    field_name, 0
-                )
+        cls = type(self)
+        # Set up the widgets once per form class, not on every instantiation.
+        if not cls.__dict__.get('_admin_widgets_ready'):
+            for field_name in getattr(self, 'raw_id_fields', None) or ():
+                self.base_fields[field_name].widget = _get_admin_widget(
+                    self._meta.model, field_name, ForeignKeyRawIdWidget)
+            for field_name in getattr(self, 'filter_horizontal', None) or ():
+                self.base_fields[field_name].widget = _get_admin_widget(
+                    self._meta.model, field_name, FilteredSelectMultiple)
+            cls._admin_widgets_ready = True
 
         super(FormWithAdminFeatures, self).__init__(*args, **kwargs)
         if hasattr(self, 'content_field_name') \
@@ -46,10 +64,7 @@ class FormWithRawIDFields(FormWithAdminFeatures):
 
 try:
     from adminboost.preview import ImagePreviewInlineForm # Soft dependency on adminboost
-    import os
-    from django.core.files import File
-    from django.conf import settings
-    from easy_thumbnails.files import Thumbnailer
+    from .previews import PreviewImage
 
     class ImagePreviewContentForm(ImagePreviewInlineForm, ItemEditorForm):
 
@@ -58,18 +73,10 @@ try:
 
     class FixedImagePreviewForm(ImagePreviewInlineForm, ItemEditorForm):
         preview_instance_required = False
-        preview_paths = []
+        preview_paths = [] # Relative to the default storage, i.e. MEDIA_ROOT
 
         def get_images(self, instance):
-            images = []
-            for path in self.preview_paths:
-                file_data = open(os.path.join(settings.MEDIA_ROOT, path), 'r')
-                class MockImage(object):
-                    pass
-                image = MockImage()
-                image.file = Thumbnailer(File(file_data), name=path)
-                images.append(image)
-            return images
+            return [PreviewImage(path) for path in self.preview_paths]
 
 except ImportError:
     pass
@@ -0,0 +1,125 @@
+"""
+Inherited regions for ``HierarchicalFeinCMSDocument`` models.
+
+FeinCMS fills an empty inherited region from the nearest ancestor that has
+content in it by asking each ancestor in turn, one query per level.
+``get_inherited_counts`` asks about all ancestors at once, using their MPTT
+range, and picks the nearest one in memory. The answer only depends on the
+parent, so it is cached per parent -- and so shared by the whole subtree
+below it -- until content or a document of that model changes.
+"""
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_save, post_delete
+
+from . import routers
+from . import settings as feincmstools_settings
+from .signals import content_changed
+from .utils import model_cache_key, get_cache_version, bump_cache_version
+
+CACHE_PREFIX = 'feincmstools:inherited'
+
+
+def _version_key(model):
+    return '%s:version' % model_cache_key(CACHE_PREFIX, model)
+
+
+def invalidate_inherited_content(model):
+    """
+    Discard all cached inherited content for ``model``.
+    """
+    bump_cache_version(_version_key(model))
+
+
+def _fetch_inherited_counts(proxy, regions):
+    """
+    Which content the nearest ancestor with content in each of ``regions``
+    has, in the form of ``ContentProxy._fetch_content_type_counts``.
+    """
+    item = proxy.item
+    connection = connections[proxy.db]
+    qn = connection.ops.quote_name
+    placeholders = ','.join(['%%s'] * len(regions))
+    tmpl = ('SELECT %(idx)d AS ct_idx, c.parent_id, c.region, COUNT(c.id), d.lft'
+            ' FROM %(content)s c INNER JOIN %(document)s d ON c.parent_id = d.%(pk)s'
+            ' WHERE d.tree_id = %%s AND d.lft < %%s AND d.rght > %%s'
+            ' AND c.region IN (' + placeholders + ')'
+            ' GROUP BY c.parent_id, c.region, d.lft')
+    sql = ' UNION '.join([tmpl % {
+        'idx': idx,
+        'content': qn(cls._meta.db_table),
+        'document': qn(item._meta.db_table),
+        'pk': qn(item._meta.pk.column),
+    } for idx, cls in enumerate(item._feincms_content_types)])
+    args = ([item.tree_id, item.lft, item.rght] + list(regions)) * len(item._feincms_content_types)
+    cursor = connection.cursor()
+    cursor.execute('SELECT * FROM ( ' + sql + ' ) AS ct ORDER BY ct_idx', args)
+
+    nearest = {} # region -> lft of the nearest ancestor with content there
+    rows = []
+    for ct_idx, pk, region, count, lft in cursor.fetchall():
+        if count:
+            rows.append((ct_idx, pk, region, lft))
+            nearest[region] = max(nearest.get(region, lft), lft)
+    counts = {}
+    for ct_idx, pk, region, lft in rows:
+        if lft == nearest[region]:
+            counts.setdefault(region, []).append((pk, ct_idx))
+    return counts
+
+
+def get_inherited_counts(proxy, regions):
+    """
+    Like ``_fetch_inherited_counts``, but cached per parent (and template)
+    for ``FEINCMSTOOLS_INHERITED_CONTENT_CACHE_TIMEOUT`` seconds.
+    """
+    timeout = feincmstools_settings.INHERITED_CONTENT_CACHE_TIMEOUT
+    if not timeout:
+        return _fetch_inherited_counts(proxy, regions)
+
+    item = proxy.item
+    content_types = item._feincms_content_types
+    key = '%s:%s:%s:%s' % (model_cache_key(CACHE_PREFIX, type(item)),
+                           get_cache_version(_version_key(type(item))),
+                           item.parent_id, item.template.key)
+    # Content types are cached by table rather than by index, so that a
+    # change to the registered content types cannot mix them up.
+    cached = cache.get(key)
+    if cached is not None:
+        indexes = dict((cls._meta.db_table, idx) for idx, cls in enumerate(content_types))
+        if all(table in indexes for entries in cached.values() for pk, table in entries):
+            return dict((region, [(pk, indexes[table]) for pk, table in entries])
+                        for region, entries in cached.items())
+
+    counts = _fetch_inherited_counts(proxy, regions)
+    if routers.get_read_database():
+        # Don't keep what a lagging replica says for longer than writers
+        # read from the primary anyway.
+        timeout = min(timeout, feincmstools_settings.READ_AFTER_WRITE_WINDOW)
+    cache.set(key, dict(
+        (region, [(pk, content_types[idx]._meta.db_table) for pk, idx in entries])
+        for region, entries in counts.items()), timeout)
+    return counts
+
+
+def _content_changed(sender, **kwargs):
+    if hasattr(sender, 'get_ancestors'):
+        invalidate_inherited_content(sender)
+
+content_changed.connect(_content_changed, dispatch_uid='feincmstools:inheritance')
+
+
+def _document_changed(sender, **kwargs):
+    invalidate_inherited_content(sender)
+
+
+def connect_signals(model):
+    """
+    Invalidate cached inherited content for ``model`` whenever one of its
+    documents is saved (or moved) or deleted. Called for every concrete
+    HierarchicalFeinCMSDocument.
+    """
+    uid = 'feincmstools:inheritance:%s.%s' % (model.__module__, model.__name__)
+    post_save.connect(_document_changed, sender=model, dispatch_uid=uid)
+    post_delete.connect(_document_changed, sender=model, dispatch_uid=uid)
@@ -0,0 +1,128 @@
+"""
+Lightweight, read-only content for rendering.
+
+Content types which list the fields their templates (and ``extra_context``)
+need in ``render_fields`` can be rendered without creating model instances:
+``render_region(document, region, request, lightweight=True)`` fetches only
+those columns, with ``values_list``, and wraps each row in a small proxy with
+``__slots__``. Proxies have the listed fields, ``id``/``pk``, ``parent_id``,
+``region`` and ``ordering``, as well as the content type's ``extra_context``,
+``bulk_extra_context`` and rendering options, and are rendered with the
+content type's templates as usual::
+
+    class Quote(Content):
+        quote = models.TextField()
+        source = models.CharField(max_length=100)
+
+        render_fields = ('quote', 'source')
+
+Content types without ``render_fields`` are fetched as full instances.
+"""
+
+import operator
+
+from django.db.models import Q
+
+BASE_FIELDS = ('id', 'parent_id', 'region', 'ordering')
+
+# Taken over from the content type, so that proxies behave like its instances
+# when rendered.
+_COPIED_ATTRIBUTES = ('render_template', 'render_concurrently', 'render_timeout',
+                      'render_fallback', 'extra_context', 'prepare_bulk_extra_context')
+
+
+class LightweightContent(object):
+    """
+    Base class of the proxies. ``get_lightweight_class`` makes one subclass
+    per content type.
+    """
+    __slots__ = BASE_FIELDS + ('_bulk_extra_context',)
+    _content_model = None
+    _fields = BASE_FIELDS
+
+    def __init__(self, values):
+        for name, value in zip(self._fields, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        if name != '_bulk_extra_context':
+            raise AttributeError('%s is read-only.' % type(self).__name__)
+        object.__setattr__(self, name, value)
+
+    def __repr__(self):
+        return '<%s: %s>' % (type(self).__name__, self.id)
+
+    @property
+    def pk(self):
+        return self.id
+
+    def render(self, **kwargs):
+        model = self._content_model
+        template = self.render_template or model._find_render_template_path(self.region)
+        return model._render_with_template(self, template, **kwargs)
+
+    def _get_bulk_extra_context(self, request):
+        cached = getattr(self, '_bulk_extra_context', None)
+        if cached is None or cached[0] is not request:
+            type(self).prepare_bulk_extra_context([self], request)
+        return self._bulk_extra_context[1]
+
+
+_classes = {}
+
+
+def get_lightweight_class(content_type):
+    """
+    :return: The proxy class for ``content_type``, which must have
+             ``render_fields``.
+    """
+    try:
+        return _classes[content_type]
+    except KeyError:
+        pass
+    fields = tuple(name for name in content_type.render_fields if name not in BASE_FIELDS)
+    attrs = {
+        '__slots__': fields,
+        '__module__': __name__,
+        '_content_model': content_type,
+        '_fields': BASE_FIELDS + fields,
+    }
+    for name in _COPIED_ATTRIBUTES:
+        for klass in content_type.__mro__:
+            if name in klass.__dict__:
+                attrs[name] = klass.__dict__[name]
+                break
+    if hasattr(content_type, 'bulk_extra_context'):
+        # Still bound to the content type itself.
+        attrs['bulk_extra_context'] = staticmethod(content_type.bulk_extra_context)
+    cls = _classes[content_type] = type(
+        'Lightweight%s' % content_type.__name__, (LightweightContent,), attrs)
+    return cls
+
+
+def fetch_region(feincms_object, region):
+    """
+    :return: The content of ``region`` on ``feincms_object`` (inherited, if
+             the region is), in order, as proxies where possible.
+    """
+    proxy = feincms_object.content
+    if 'regions' in proxy._cache:
+        # Already fetched in full; no need to fetch it again.
+        return getattr(proxy, region)
+
+    content_types = feincms_object._feincms_content_types
+    pks_by_type = {}
+    for pk, ct_idx in proxy._fetch_content_type_counts().get(region, []):
+        pks_by_type.setdefault(content_types[ct_idx], []).append(pk)
+
+    contents = []
+    for content_type, pks in pks_by_type.items():
+        query = Q(region=region, parent__in=pks)
+        if getattr(content_type, 'render_fields', None) is None:
+            contents.extend(content_type.get_queryset(query))
+        else:
+            cls = get_lightweight_class(content_type)
+            contents.extend(cls(values) for values in
+                content_type._default_manager.filter(query).values_list(*cls._fields))
+    contents.sort(key=operator.attrgetter('ordering'))
+    return contents
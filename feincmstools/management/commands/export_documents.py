@@ -0,0 +1,69 @@
+import json
+import sys
+from optparse import make_option
+
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import reset_queries
+
+from mptt.models import MPTTModel
+
+from ... import registry
+from ...utils import iterate_in_chunks
+
+def get_documents(labels):
+    """
+    The registered documents named by ``labels`` (in app.Model or app format),
+    or all of them.
+    """
+    documents = registry.get_documents()
+    if not labels:
+        return documents
+    selected = []
+    for label in labels:
+        matches = [document for document in documents
+                   if label.lower() in (document._meta.app_label,
+                       '%s.%s' % (document._meta.app_label, document._meta.object_name.lower()))]
+        if not matches:
+            raise CommandError('"%s" is not a FeinCMS document or an app containing one.' % label)
+        selected.extend(match for match in matches if match not in selected)
+    return selected
+
+class Command(BaseCommand):
+    args = '[app.Model or app ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--output', '-o', dest='output', default=None, help='Write to this file instead of standard output.'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=1000, help='Number of rows fetched per query.'),
+        )
+    help = 'Export FeinCMS documents and their content as JSON Lines, one object per line, without loading whole tables into memory.'
+
+    def handle(self, *labels, **options):
+        chunk_size = options.get('chunk_size') or 1000
+        verbosity = int(options.get('verbosity', 1))
+        output = options.get('output')
+        out = open(output, 'w') if output else sys.stdout
+        try:
+            for document in get_documents(labels):
+                # Documents come before their content, and parents before
+                # their children, so the file can be loaded in order.
+                if issubclass(document, MPTTModel):
+                    opts = document._mptt_meta
+                    order_by = (opts.tree_id_attr, opts.left_attr)
+                else:
+                    order_by = ('pk',)
+                models = [(document, order_by)] + [(content_type, ('pk',))
+                    for content_type in registry.get_generated_content_types(document).values()]
+                for model, order_by in models:
+                    count = 0
+                    for chunk in iterate_in_chunks(model._default_manager.all(), order_by, chunk_size):
+                        for record in serializers.serialize('python', chunk):
+                            out.write(json.dumps(record, cls=DjangoJSONEncoder))
+                            out.write('\n')
+                        count += len(chunk)
+                        reset_queries()
+                    if verbosity > 1 and output:
+                        print 'Exported %d %s.' % (count, model._meta.verbose_name_plural)
+        finally:
+            if output:
+                out.close()
@@ -6,8 +6,7 @@ from south.migration import Migrations
 from south.exceptions import NoMigrations
 from south.management.commands.schemamigration import Command as SchemaMigration
 
-from ...base import FeinCMSDocument
-from ...utils import get_subclasses
+from ... import registry
 
 class ExitCommand(Exception):
     pass
@@ -45,7 +44,7 @@ class Command(BaseCommand):
         # Workaround South's sneaky method of ending commands with error() calls
         SchemaMigration.error = error_log
         # Get list of apps that have models which subclass FeinCMSDocument
-        apps_to_migrate = [model._meta.app_label for model in get_subclasses(FeinCMSDocument)]
+        apps_to_migrate = [model._meta.app_label for model in registry.get_documents()]
         if verbosity:
             print 'Automatic schema migrations will be created for the following apps:'
             print '\t%s' % ', '.join(apps_to_migrate)
@@ -0,0 +1,111 @@
+import json
+from itertools import groupby
+from optparse import make_option
+
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connections, reset_queries, transaction, DEFAULT_DB_ALIAS
+
+from mptt.models import MPTTModel
+
+from ... import inheritance
+from ... import navigation
+from ...mixins import HierarchicalSlug
+
+def read_records(files):
+    for filename in files:
+        with open(filename) as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError, e:
+                    raise CommandError('%s, line %d: %s' % (filename, number, e))
+
+def chunks(records, chunk_size):
+    """
+    Group consecutive records of the same model into lists of at most
+    ``chunk_size``.
+    """
+    for model, model_records in groupby(records, lambda record: record['model']):
+        chunk = []
+        for record in model_records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+class Command(BaseCommand):
+    args = '<file.jsonl file.jsonl ...>'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int', default=1000, help='Number of rows inserted per query.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS, help='The database to load into.'),
+        make_option('--no-rebuild', action='store_false', dest='rebuild', default=True, help='Do not rebuild MPTT trees and hierarchical slugs afterwards.'),
+        )
+    help = 'Load documents and content exported with export_documents, with one bulk INSERT per chunk. save() is not called, so MPTT trees and hierarchical slugs are rebuilt once at the end instead.'
+
+    def handle(self, *files, **options):
+        if not files:
+            raise CommandError('Give at least one file to import.')
+        chunk_size = options.get('chunk_size') or 1000
+        using = options.get('database', DEFAULT_DB_ALIAS)
+        rebuild = options.get('rebuild', True)
+        verbosity = int(options.get('verbosity', 1))
+
+        counts = {} # model -> number of rows, in the order first seen
+        models = []
+        with transaction.atomic(using=using):
+            for chunk in chunks(read_records(files), chunk_size):
+                objects = list(serializers.deserialize('python', chunk, using=using))
+                model = type(objects[0].object)
+                if model not in counts:
+                    counts[model] = 0
+                    models.append(model)
+                model._default_manager.db_manager(using).bulk_create(
+                    [obj.object for obj in objects])
+                for name in (objects[0].m2m_data or {}):
+                    # bulk_create leaves out many-to-many relations.
+                    field = model._meta.get_field(name)
+                    through = field.rel.through
+                    from_name = '%s_id' % field.m2m_field_name()
+                    to_name = '%s_id' % field.m2m_reverse_field_name()
+                    through._default_manager.db_manager(using).bulk_create([
+                        through(**{from_name: obj.object.pk, to_name: pk})
+                        for obj in objects for pk in obj.m2m_data.get(name, [])])
+                counts[model] += len(objects)
+                reset_queries()
+
+            if rebuild:
+                for model in models:
+                    if issubclass(model, MPTTModel):
+                        if verbosity > 1:
+                            print 'Rebuilding the tree of %s.' % model._meta.verbose_name_plural
+                        model._tree_manager.db_manager(using).rebuild()
+                    if issubclass(model, HierarchicalSlug) and issubclass(model, MPTTModel):
+                        if verbosity > 1:
+                            print 'Rebuilding the slugs of %s.' % model._meta.verbose_name_plural
+                        model.rebuild_slugs(chunk_size, using)
+
+            # Explicit primary keys do not advance sequences.
+            connection = connections[using]
+            sequence_sql = connection.ops.sequence_reset_sql(no_style(), models)
+            if sequence_sql:
+                cursor = connection.cursor()
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+        # bulk_create sends no signals, so cached trees have to be dropped
+        # here.
+        for model in models:
+            if hasattr(model, 'get_ancestors') and hasattr(model, '_feincms_content_types'):
+                navigation.invalidate_navigation(model)
+                inheritance.invalidate_inherited_content(model)
+
+        if verbosity:
+            for model in models:
+                print 'Imported %d %s.' % (counts[model], model._meta.verbose_name_plural)
@@ -0,0 +1,69 @@
+import logging
+from multiprocessing import Pool
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ... import publishing
+from ...utils import iterate_in_chunks
+from .export_documents import get_documents
+
+logger = logging.getLogger(__name__)
+
+def publish_chunk(model, pks):
+    """
+    Publish the documents of ``model`` with primary keys ``pks``, in a worker
+    process.
+    """
+    published = 0
+    for document in model._default_manager.filter(pk__in=pks):
+        try:
+            if publishing.publish(document):
+                published += 1
+        except Exception:
+            logger.exception('Could not publish %s.', document)
+    return published
+
+class Command(BaseCommand):
+    args = '[app.Model or app ...]'
+    option_list = BaseCommand.option_list + (
+        make_option('--all', action='store_true', dest='all', default=False, help='Publish every document, not only those which are missing or out of date.'),
+        make_option('--processes', dest='processes', type='int', default=None, help='Number of worker processes (default: one per CPU).'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=100, help='Number of documents handed to a worker at a time.'),
+        )
+    help = 'Render the static copies of documents with publish_static = True which are missing or older than get_last_modified(), in parallel worker processes.'
+
+    def handle(self, *labels, **options):
+        if not publishing.get_publish_root():
+            raise CommandError('FEINCMSTOOLS_PUBLISH_ROOT is not set.')
+        publish_all = options.get('all', False)
+        chunk_size = options.get('chunk_size') or 100
+        verbosity = int(options.get('verbosity', 1))
+
+        documents = [document for document in get_documents(labels) if document.publish_static]
+        if not documents:
+            raise CommandError('None of these documents have publish_static = True.')
+
+        jobs = []
+        for document in documents:
+            for chunk in iterate_in_chunks(document._default_manager.all(), ('pk',), chunk_size):
+                if hasattr(document, 'prefetch_ancestors'):
+                    # Paths of hierarchical documents need their ancestors.
+                    document.prefetch_ancestors(chunk)
+                pks = [item.pk for item in chunk
+                       if publish_all or publishing.needs_publishing(item)]
+                if pks:
+                    jobs.append((document, pks))
+
+        # Forked workers must not share the parent's database connections.
+        connections.close_all()
+        pool = Pool(options.get('processes'))
+        try:
+            results = [pool.apply_async(publish_chunk, job) for job in jobs]
+            published = sum(result.get() for result in results)
+        finally:
+            pool.close()
+            pool.join()
+        if verbosity:
+            print 'Published %d document(s).' % published
@@ -0,0 +1,163 @@
+import heapq
+import os
+from optparse import make_option
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import FileField
+from django.utils.encoding import force_text
+
+from ... import registry
+
+def _storage_key(storage):
+    # Fields often have storages of their own which still point at the same
+    # directory.
+    return storage.__class__, getattr(storage, 'location', None) or id(storage)
+
+def _upload_root(field):
+    """
+    The part of ``upload_to`` which does not change from file to file.
+    """
+    if callable(field.upload_to):
+        return ''
+    root = field.upload_to
+    if '%' in root:
+        root = os.path.dirname(root.split('%')[0])
+    return root.rstrip('/')
+
+def _walk(storage, path):
+    """
+    Lazily yield the names of all files below ``path`` in ``storage``, in
+    sorted order.
+    """
+    try:
+        directories, files = storage.listdir(path)
+    except OSError:
+        return
+    # Sorting directories as "name/" puts their files where they sort
+    # among their siblings' full names.
+    entries = [(force_text(name), False) for name in files] + \
+              [(force_text(name) + '/', True) for name in directories]
+    for name, is_directory in sorted(entries):
+        name = os.path.join(path, name) if path else name
+        if is_directory:
+            for name in _walk(storage, name.rstrip('/')):
+                yield name
+        else:
+            yield name
+
+def _get_fields(storage_key):
+    """
+    All file fields of any model which store in the storage, not only those of
+    content types: other models may upload to the same directories.
+    """
+    return [(model, field) for model in apps.get_models() for field in model._meta.fields
+            if isinstance(field, FileField) and _storage_key(field.storage) == storage_key]
+
+def _get_referenced(fields, root):
+    """
+    Lazily yield the names of the files below ``root`` that ``fields`` or
+    easy_thumbnails refer to, in (the database's) sorted order.
+    """
+    prefix = root.rstrip('/') + '/' if root else ''
+    streams = [model._default_manager.filter(**{'%s__startswith' % field.attname: prefix})
+               .order_by(field.attname).values_list(field.attname, flat=True).iterator()
+               for model, field in fields]
+    if 'easy_thumbnails' in settings.INSTALLED_APPS:
+        from easy_thumbnails.models import Thumbnail
+        streams.append(Thumbnail.objects.filter(name__startswith=prefix)
+                       .order_by('name').values_list('name', flat=True).iterator())
+    return heapq.merge(*streams)
+
+def _unreferenced(names, referenced):
+    """
+    Yield those of ``names`` which are not in ``referenced``, both sorted.
+    """
+    referenced = iter(referenced)
+    current = next(referenced, None)
+    for name in names:
+        while current is not None and current < name:
+            current = next(referenced, None)
+        if current != name:
+            yield name
+
+def _is_referenced(name, fields):
+    """
+    Whether ``fields`` or easy_thumbnails refer to ``name``, or to a file it is
+    named after, as thumbnails are (``photo.jpg.100x100_q85.jpg``). The merge
+    in ``_unreferenced`` relies on the database sorting names like Python
+    does; this makes sure of each file before it is reported.
+    """
+    head, tail = os.path.split(name)
+    names = [name] + [os.path.join(head, tail[:dot])
+                      for dot in range(len(tail)) if tail[dot] == '.' and dot]
+    for model, field in fields:
+        if model._default_manager.filter(**{'%s__in' % field.attname: names}).exists():
+            return True
+    if 'easy_thumbnails' in settings.INSTALLED_APPS:
+        from easy_thumbnails.models import Thumbnail
+        if Thumbnail.objects.filter(name=name).exists():
+            return True
+    return False
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--delete', action='store_true', dest='delete', default=False, help='Delete the orphaned files, rather than only listing them.'),
+        make_option('--path', action='append', dest='paths', default=[], help='Only look below this path in storage. May be given more than once.'),
+        )
+    help = 'List (or, with --delete, delete) files below the upload directories of FeinCMS content types that no model refers to. Thumbnails of referenced files are kept.'
+
+    def handle(self, *args, **options):
+        delete = options.get('delete', False)
+        paths = options.get('paths') or []
+        verbosity = int(options.get('verbosity', 1))
+
+        # Gather every file field of every content type, grouped by storage.
+        fields = {}
+        storages = {}
+        for document in registry.get_documents():
+            for content_type in registry.get_generated_content_types(document).values():
+                for field in content_type._meta.fields:
+                    if isinstance(field, FileField):
+                        key = _storage_key(field.storage)
+                        storages.setdefault(key, field.storage)
+                        fields.setdefault(key, []).append((content_type, field))
+
+        found = 0
+        for key, storage_fields in fields.items():
+            storage = storages[key]
+            referencing = _get_fields(key)
+            if paths:
+                roots = set(paths)
+            else:
+                roots = set()
+                for content_type, field in storage_fields:
+                    root = _upload_root(field)
+                    if root:
+                        roots.add(root)
+                    elif verbosity:
+                        # Sweeping the whole storage would catch files that
+                        # have nothing to do with content.
+                        print 'Skipping %s.%s, which has no fixed upload directory; use --path.' % (
+                            content_type.__name__, field.name)
+            # Skip roots below other roots, so no file is seen twice.
+            roots = [root for root in roots if not any(
+                other != root and root.startswith(other.rstrip('/') + '/')
+                for other in roots)]
+            for root in sorted(roots):
+                # Compare the sorted listing with the sorted names in the
+                # database, so that neither has to be held in memory.
+                for name in _unreferenced(_walk(storage, root),
+                                          _get_referenced(referencing, root)):
+                    if _is_referenced(name, referencing):
+                        continue
+                    found += 1
+                    if delete:
+                        storage.delete(name)
+                        if verbosity:
+                            print 'Deleted %s' % name
+                    elif verbosity:
+                        print name
+        if verbosity > 1 or (verbosity and not found):
+            print '%d orphaned file(s) %s.' % (found, 'deleted' if delete else 'found')
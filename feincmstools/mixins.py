@@ -1,6 +1,7 @@
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.db import models
 from feincmstools.fields import HierarchicalSlugField
+from feincmstools.utils import bulk_update, iterate_in_chunks
 
 class HierarchicalSlug(models.Model):
     def __init__(self, *args, **kwargs):
@@ -78,6 +79,7 @@ class HierarchicalSlug(models.Model):
                 children_accessor = lambda self_: getattr(self_, children_field_name).all()
 
             # Add accessor properties and methods to the class
+            self.__class__._slug_field_name = slug_field_name
             self.__class__._the_slug = property(
                 lambda self_: getattr(self_, slug_field_name),
                 lambda self_, value: setattr(self_, slug_field_name, value))
@@ -104,6 +106,47 @@ class HierarchicalSlug(models.Model):
         if self._get_parent() and self._get_parent()._the_slug:
             self._the_slug = '%s/%s' % (self._get_parent()._the_slug, self._the_slug)
 
+    @classmethod
+    def rebuild_slugs(cls, chunk_size=1000, using=None, root=None):
+        """
+        Recalculate every slug from its parent's, without calling ``save()``,
+        e.g. after loading data with ``bulk_create``, in database ``using``
+        (if given). With ``root``, only the slugs of that node and its
+        descendants are. Only MPTT models are supported, and their tree fields
+        must be correct.
+        """
+        cls()._prepare_model()
+        opts = cls._mptt_meta
+        ancestors = [] # (tree_id, rght, slug) of the ancestors of each node
+        queryset = cls._default_manager.db_manager(using).all()
+        if root is not None:
+            tree_id = getattr(root, opts.tree_id_attr)
+            rght = getattr(root, opts.right_attr)
+            queryset = queryset.filter(**{
+                opts.tree_id_attr: tree_id,
+                '%s__gte' % opts.left_attr: getattr(root, opts.left_attr),
+                '%s__lte' % opts.right_attr: rght,
+            })
+            parent = root._get_parent()
+            if parent is not None:
+                ancestors.append((tree_id, rght, parent._the_slug))
+        for chunk in iterate_in_chunks(queryset,
+                (opts.tree_id_attr, opts.left_attr), chunk_size):
+            changed = []
+            for node in chunk:
+                tree_id = getattr(node, opts.tree_id_attr)
+                while ancestors and (ancestors[-1][0] != tree_id
+                        or ancestors[-1][1] < getattr(node, opts.left_attr)):
+                    ancestors.pop()
+                slug = node.truncated_slug()
+                if ancestors and ancestors[-1][2]:
+                    slug = '%s/%s' % (ancestors[-1][2], slug)
+                if slug != node._the_slug:
+                    node._the_slug = slug
+                    changed.append(node)
+                ancestors.append((tree_id, getattr(node, opts.right_attr), slug))
+            bulk_update(cls, changed, [cls._slug_field_name], using)
+
     def validate_unique(self, *args, **kwargs):
         self._generate_slug()
         super(HierarchicalSlug, self).validate_unique(*args, **kwargs)
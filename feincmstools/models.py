@@ -1,10 +1,14 @@
 from django.utils.datastructures import SortedDict
 import sys
 
+from . import registry
+from .signals import connect_content_type
+
 def create_content_types(feincms_model, content_types_by_region_fn):
 
     # retrieve a mapping of content types for each region
     types_by_regions = [(r.key, content_types_by_region_fn(r.key)) for r in feincms_model._feincms_all_regions]
+    registry.register_document(feincms_model, types_by_regions)
 
     # populate a dict of registration parameters for each type
     # e.g. type: (category, [regions])
@@ -36,6 +40,12 @@ def create_content_types(feincms_model, content_types_by_region_fn):
             optgroup=option_group,
             **kwargs
         )
+        if new_content_type is None:
+            # FeinCMS declined to create it, and has warned why.
+            continue
+
+        registry.register_generated(feincms_model, type, new_content_type)
+        connect_content_type(new_content_type)
 
         # FeinCMS does not correctly fake the module appearance,
         # and shell_plus becomes subsequently confused.
@@ -0,0 +1,128 @@
+"""
+Cached navigation trees for ``HierarchicalFeinCMSDocument`` models.
+
+A tree (or a depth-limited slice of one) is fetched in a single ordered query
+and kept in the cache until a document of that model is saved or deleted.
+Per-request state -- which node is the current page and which are its
+ancestors -- is worked out in memory, so menus need no further queries.
+
+See the ``feincmstools_navigation`` template tag.
+"""
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+
+from . import settings as feincmstools_settings
+from .utils import model_cache_key, get_cache_version, bump_cache_version
+
+CACHE_PREFIX = 'feincmstools:navigation'
+
+
+class NavigationNode(object):
+    """
+    A document in a navigation tree. The document itself is ``node.page``.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.parent = None
+        self.children = []
+        self.is_current = False
+        self.is_ancestor = False # an ancestor of the current page
+
+    @property
+    def is_selected(self):
+        return self.is_current or self.is_ancestor
+
+    def __repr__(self):
+        return '<NavigationNode: %r>' % self.page
+
+
+def _model_key(model):
+    return model_cache_key(CACHE_PREFIX, model)
+
+
+def get_navigation_version(model):
+    """
+    The version of the navigation trees of ``model``, which changes whenever
+    they are invalidated.
+    """
+    return get_cache_version('%s:version' % _model_key(model))
+
+
+def invalidate_navigation(model):
+    """
+    Discard all cached navigation trees for ``model``.
+    """
+    bump_cache_version('%s:version' % _model_key(model))
+
+
+def _invalidate_on_change(sender, **kwargs):
+    invalidate_navigation(sender)
+
+
+def connect_signals(model):
+    """
+    Invalidate cached navigation for ``model`` whenever one of its documents
+    is saved or deleted. Moving a node in the tree editor saves it too.
+    """
+    uid = '%s:invalidate' % _model_key(model)
+    post_save.connect(_invalidate_on_change, sender=model, dispatch_uid=uid)
+    post_delete.connect(_invalidate_on_change, sender=model, dispatch_uid=uid)
+
+
+def get_navigation_pages(model, root=None, depth=None):
+    """
+    Return all documents of ``model`` in tree order, fetched with one query
+    and cached.
+
+    :param root: only return the descendants of this document.
+    :param depth: only return this many levels (below ``root``, if given).
+    """
+    key = '%s:%s:%s:%s' % (_model_key(model), get_navigation_version(model),
+                           root.pk if root else '', depth or '')
+    pages = cache.get(key)
+    if pages is None:
+        queryset = model._default_manager.order_by('tree_id', 'lft')
+        base_level = 0
+        if root is not None:
+            queryset = queryset.filter(tree_id=root.tree_id,
+                                       lft__gt=root.lft, rght__lt=root.rght)
+            base_level = root.level + 1
+        if depth:
+            queryset = queryset.filter(level__lt=base_level + depth)
+        pages = list(queryset)
+        cache.set(key, pages, feincmstools_settings.NAVIGATION_CACHE_TIMEOUT)
+    return pages
+
+
+def build_navigation(pages, current=None):
+    """
+    Arrange ``pages`` (in tree order) into ``NavigationNode``s and return the
+    top-level nodes. Nodes are marked as current, or as an ancestor of
+    ``current``, without touching the database.
+    """
+    nodes = {}
+    roots = []
+    if current is not None:
+        # Ancestors of current by MPTT range, including those that are not
+        # in ``pages`` themselves.
+        ancestor_pks = set(
+            page.pk for page in pages
+            if page.tree_id == current.tree_id
+            and page.lft < current.lft and page.rght > current.rght)
+    else:
+        ancestor_pks = set()
+
+    for page in pages:
+        node = NavigationNode(page)
+        nodes[page.pk] = node
+        node.is_ancestor = page.pk in ancestor_pks
+        node.is_current = current is not None and page.pk == current.pk
+        parent = nodes.get(page.parent_id)
+        if parent is not None:
+            node.parent = parent
+            parent.children.append(node)
+        else:
+            roots.append(node)
+    return roots
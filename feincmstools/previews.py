@@ -0,0 +1,136 @@
+"""
+Cached preview thumbnails for the admin image preview forms.
+
+Thumbnail URLs are memoized by source path, modification time and thumbnail
+options. A missing thumbnail is generated on a small pool of background
+threads, so rendering a form never opens a source image itself; the file
+handles and database connections that generation does open are closed as
+soon as it is done.
+
+The images handed to adminboost have a ``PreviewThumbnailer`` as their
+``file``, which answers any request for a thumbnail -- by options or alias,
+via ``get_thumbnailer`` or the ``thumbnail`` tag and filters -- from that
+memo. Until the preview exists, the source image itself is shown.
+"""
+
+import logging
+import threading
+
+from django.core.files.storage import default_storage
+from django.db import connections
+
+from easy_thumbnails.files import Thumbnailer
+
+from . import settings as feincmstools_settings
+from .utils import get_thread_pool
+
+logger = logging.getLogger(__name__)
+
+_urls = {} # (path, options) -> (modified time, url)
+_pending = set()
+_lock = threading.Lock()
+
+
+def _modified_time(path):
+    try:
+        return default_storage.modified_time(path)
+    except (OSError, NotImplementedError):
+        return None
+
+
+def _close(f):
+    if f is not None and not f.closed:
+        f.close()
+
+
+class Preview(object):
+    """
+    What ``PreviewThumbnailer.get_thumbnail`` returns in place of a
+    ``ThumbnailFile``: enough for templates to show it, without a file.
+    """
+
+    def __init__(self, url, width=None, height=None):
+        self.url = url
+        self.width = width
+        self.height = height
+
+    def __unicode__(self):
+        return self.url
+
+
+def _generate(key, modified_time, path, options):
+    thumbnailer = Thumbnailer(name=path)
+    thumbnail = None
+    preview = None
+    try:
+        thumbnail = thumbnailer.get_thumbnail(options)
+        preview = Preview(thumbnail.url, thumbnail.width, thumbnail.height)
+    except Exception:
+        logger.exception('Could not generate a preview of %s', path)
+    finally:
+        _close(thumbnail)
+        _close(thumbnailer)
+        # easy_thumbnails keeps track of thumbnails in the database, on this
+        # worker's own connections.
+        for connection in connections.all():
+            connection.close()
+        with _lock:
+            _pending.discard(key)
+            if preview is not None:
+                _urls[key] = (modified_time, preview)
+
+
+def get_preview(path, options):
+    """
+    Return the thumbnail of ``path`` (relative to the default storage) with
+    the easy_thumbnails ``options`` as a ``Preview``, or ``None`` if it is
+    still being generated.
+    """
+    key = (path, repr(sorted(options.items())))
+    modified_time = _modified_time(path)
+    with _lock:
+        cached = _urls.get(key)
+        if cached is not None and cached[0] == modified_time:
+            return cached[1]
+        if key in _pending:
+            return None
+        _pending.add(key)
+    pool = get_thread_pool('previews', feincmstools_settings.PREVIEW_THREAD_POOL_SIZE)
+    pool.apply_async(_generate, (key, modified_time, path, dict(options)))
+    return None
+
+
+def get_preview_url(path, options):
+    """
+    Return the URL of the preview thumbnail of ``path``, or ``None`` if it
+    is still being generated.
+    """
+    preview = get_preview(path, options)
+    return preview.url if preview is not None else None
+
+
+class PreviewThumbnailer(Thumbnailer):
+    """
+    A ``Thumbnailer`` which never generates thumbnails (or opens the source)
+    itself, but returns memoized ``Preview``s, and the source image while a
+    preview is being generated in the background.
+    """
+
+    def get_thumbnail(self, thumbnail_options, save=True, generate=None,
+                      silent_template_exception=False):
+        preview = get_preview(self.name, thumbnail_options)
+        if preview is None:
+            preview = Preview(default_storage.url(self.name))
+        return preview
+
+
+class PreviewImage(object):
+    """
+    What the preview forms' ``get_images`` returns for a path. ``file``, which
+    adminboost renders with its own thumbnail options, is a
+    ``PreviewThumbnailer``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = PreviewThumbnailer(name=path)
@@ -0,0 +1,258 @@
+"""
+Static pre-rendering of documents.
+
+Documents of models with ``publish_static = True`` are rendered to
+``<FEINCMSTOOLS_PUBLISH_ROOT>/<document.get_publish_path()>/index.html``
+whenever they or their content are saved, so that the web server can serve
+them without Django. Pages are rendered from their ``get_absolute_url()`` by
+a request handler of their own, which runs the usual URLs, views and
+middleware but sends no request signals, and written atomically. When a hierarchical document's path changes, the pages
+stored below its old path are removed; ``./manage.py publish_documents``
+renders any that are missing or out of date.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+from django.core import urlresolvers
+from django.core.handlers.base import BaseHandler
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.utils import timezone, translation
+
+from . import settings as feincmstools_settings
+from .signals import content_changed, deferring_content_changed, notify_content_changed
+from .utils import get_commit_hooks, on_commit
+
+logger = logging.getLogger(__name__)
+
+_deleting = threading.local()
+
+
+def get_publish_root():
+    return feincmstools_settings.PUBLISH_ROOT
+
+
+def get_directory(document, path=None):
+    if path is None:
+        path = document.get_publish_path()
+    return os.path.join(get_publish_root(), path.strip('/'))
+
+
+def get_filename(document):
+    return os.path.join(get_directory(document), 'index.html')
+
+
+def _write_atomic(filename, content):
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory): # Not made by another process
+                raise
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix='.publish-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(temp_filename, 0644)
+        os.rename(temp_filename, filename)
+    except Exception:
+        os.remove(temp_filename)
+        raise
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def _get_handler():
+    # One handler, with its middleware loaded once, for every thread. Unlike
+    # the test client's, it leaves the request_started and request_finished
+    # signals alone, which the requests being served rely on.
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            handler = BaseHandler()
+            handler.load_middleware()
+            _handler = handler
+    return _handler
+
+
+def render(document):
+    """
+    Render the page of ``document``, as if it had been requested from
+    ``FEINCMSTOOLS_PUBLISH_HOST``.
+
+    :return: The ``HttpResponse``.
+    """
+    from django.test import RequestFactory
+    request = RequestFactory().get(document.get_absolute_url(),
+                                   HTTP_HOST=feincmstools_settings.PUBLISH_HOST)
+    # Pages may be published in the middle of another request; leave its
+    # URLconf and language as they were.
+    urlconf = urlresolvers.get_urlconf()
+    language = translation.get_language()
+    try:
+        return _get_handler().get_response(request)
+    finally:
+        urlresolvers.set_urlconf(urlconf)
+        if language is None:
+            translation.deactivate_all()
+        else:
+            translation.activate(language)
+
+
+def publish(document):
+    """
+    Render ``document`` and store it. A document which does not render with
+    status 200 is unpublished instead.
+
+    :return: ``True`` if the document was stored.
+    """
+    response = render(document)
+    if response.status_code != 200:
+        logger.warning('Not publishing %s: %s returned status %s.',
+                       document, document.get_absolute_url(), response.status_code)
+        unpublish(document)
+        return False
+    _write_atomic(get_filename(document), response.content)
+    return True
+
+
+def unpublish(document, path=None, descendants=False):
+    """
+    Remove the stored page of ``document`` (at ``path``, if given), and with
+    ``descendants=True`` everything stored below it.
+    """
+    directory = get_directory(document, path)
+    if descendants and os.path.normpath(directory) != os.path.normpath(get_publish_root()):
+        shutil.rmtree(directory, ignore_errors=True)
+    elif os.path.exists(os.path.join(directory, 'index.html')):
+        os.remove(os.path.join(directory, 'index.html'))
+
+
+def needs_publishing(document):
+    """
+    Whether the stored page of ``document`` is missing or older than
+    ``document.get_last_modified()``.
+    """
+    filename = get_filename(document)
+    if not os.path.exists(filename):
+        return True
+    last_modified = document.get_last_modified()
+    if last_modified is None:
+        return False
+    if timezone.is_aware(last_modified):
+        stored = datetime.utcfromtimestamp(os.path.getmtime(filename))
+        last_modified = timezone.make_naive(last_modified, timezone.utc)
+    else:
+        stored = datetime.fromtimestamp(os.path.getmtime(filename))
+    return last_modified > stored
+
+
+class _Publish(object):
+    # Equal jobs are only queued once per transaction.
+
+    def __init__(self, model, pk):
+        self.model = model
+        self.pk = pk
+
+    def __eq__(self, other):
+        return isinstance(other, _Publish) and (self.model, self.pk) == (other.model, other.pk)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __call__(self):
+        try:
+            document = self.model._default_manager.get(pk=self.pk)
+        except self.model.DoesNotExist:
+            return
+        try:
+            publish(document)
+        except Exception:
+            logger.exception('Could not publish %s.', document)
+
+
+def schedule_publish(model, pk):
+    """
+    Publish the document once the current transaction commits.
+    """
+    if not get_publish_root() or (model, pk) in getattr(_deleting, 'documents', ()):
+        return
+    job = _Publish(model, pk)
+    if job not in get_commit_hooks():
+        on_commit(job)
+
+
+def _content_changed(sender, pk, **kwargs):
+    if getattr(sender, 'publish_static', False):
+        schedule_publish(sender, pk)
+
+content_changed.connect(_content_changed, dispatch_uid='feincmstools:publishing')
+
+
+def _document_saving(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk or not get_publish_root():
+        return
+    try:
+        old = sender._default_manager.get(pk=instance.pk)
+    except sender.DoesNotExist:
+        return
+    old_path = old.get_publish_path()
+    hierarchical = hasattr(old, 'get_descendants')
+    if (old_path != instance.get_publish_path()
+            or (hierarchical and old.parent_id != instance.parent_id)):
+        # The pages of descendants are stored below the old path, and their
+        # paths have changed too.
+        unpublish(old, old_path, descendants=hierarchical)
+
+
+def _document_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if deferring_content_changed():
+        # The content is about to be saved too (as in the admin); publish
+        # once, with the final content, when content_changed is sent.
+        notify_content_changed(sender, instance.pk)
+    else:
+        schedule_publish(sender, instance.pk)
+
+
+def _document_deleting(sender, instance, **kwargs):
+    if not get_publish_root():
+        return
+    # Deleting its content must not publish the document again.
+    _deleting.__dict__.setdefault('documents', set()).add((sender, instance.pk))
+    hierarchical = hasattr(instance, 'get_descendants')
+    if hierarchical:
+        # MPTT has already closed the gap in the tree, so the ancestors are
+        # found by following parents instead.
+        ancestors = []
+        parent_id = instance.parent_id
+        while parent_id:
+            parent = sender._default_manager.get(pk=parent_id)
+            ancestors.insert(0, parent)
+            parent_id = parent.parent_id
+        instance._prefetched_ancestors = ancestors
+    unpublish(instance, descendants=hierarchical)
+
+
+def _document_deleted(sender, instance, **kwargs):
+    getattr(_deleting, 'documents', set()).discard((sender, instance.pk))
+
+
+def connect_signals(model):
+    """
+    Keep the stored pages of ``model`` up to date. Called for every concrete
+    FeinCMSDocument with ``publish_static = True``.
+    """
+    uid = 'feincmstools:publishing:%s.%s' % (model.__module__, model.__name__)
+    pre_save.connect(_document_saving, sender=model, dispatch_uid=uid)
+    post_save.connect(_document_saved, sender=model, dispatch_uid=uid)
+    pre_delete.connect(_document_deleting, sender=model, dispatch_uid=uid)
+    post_delete.connect(_document_deleted, sender=model, dispatch_uid=uid)
@@ -0,0 +1,117 @@
+"""
+An index of FeinCMS documents and their content types.
+
+Each concrete ``FeinCMSDocument`` is added when its content types are
+registered (see :py:func:`feincmstools.models.create_content_types`), so
+afterwards questions such as "which content types does this document use?"
+or "which documents use this content type?" are answered without calling
+``content_types_by_region`` again.
+"""
+
+from django.utils.datastructures import SortedDict
+
+_documents = SortedDict() # document -> _DocumentEntry
+_usage = {} # content type -> (set of documents, set of regions)
+
+
+class _DocumentEntry(object):
+    def __init__(self, types_by_region):
+        # As returned by ``content_types_by_region``, per region:
+        # [(region, [(category, types), ...]), ...]
+        self.types_by_region = types_by_region
+        self.regions = SortedDict() # region -> [content types]
+        for region, categories in types_by_region:
+            types = self.regions.setdefault(region, [])
+            for category, category_types in categories:
+                for type in category_types:
+                    type = _unwrap(type)
+                    if type not in types:
+                        types.append(type)
+        self.used_types = frozenset(
+            type for types in self.regions.values() for type in types)
+        self.generated = SortedDict() # content type -> concrete class
+
+
+def _unwrap(type):
+    # Types may be given as ``(type, kwargs)`` for ``create_content_type``.
+    if isinstance(type, (list, tuple)):
+        return type[0]
+    return type
+
+
+def register_document(document, types_by_region):
+    """
+    Record the content types of ``document``, with ``types_by_region`` in the
+    form returned by ``FeinCMSDocument._get_content_types_by_region``.
+    """
+    entry = _documents[document] = _DocumentEntry(types_by_region)
+    for region, types in entry.regions.items():
+        for type in types:
+            documents, regions = _usage.setdefault(type, (set(), set()))
+            documents.add(document)
+            regions.add(region)
+    return entry
+
+
+def register_generated(document, content_type, concrete_class):
+    """
+    Record ``concrete_class`` as the class FeinCMS generated for
+    ``content_type`` on ``document``.
+    """
+    _documents[document].generated[content_type] = concrete_class
+
+
+def get_documents():
+    """
+    :return: All registered concrete documents, in registration order.
+    :rtype: ``list``
+    """
+    return _documents.keys()
+
+
+def is_registered(document):
+    return document in _documents
+
+
+def get_types_by_region(document):
+    """
+    :return: What ``content_types_by_region`` returned for each region of
+             ``document``, as a ``list`` of ``(region, categories)``. The
+             list is a copy, so callers may change it.
+    """
+    return [(region, list(categories))
+            for region, categories in _documents[document].types_by_region]
+
+
+def get_region_content_types(document, region):
+    """
+    :return: The content types allowed in ``region`` of ``document``.
+    :rtype: ``list``
+    """
+    return list(_documents[document].regions.get(region, []))
+
+
+def get_used_content_types(document):
+    """
+    :return: All content types used by ``document``.
+    :rtype: ``frozenset``
+    """
+    return _documents[document].used_types
+
+
+def get_content_type_usage(content_type):
+    """
+    :return: The documents using ``content_type`` and the regions it is used
+             in, as a ``(documents, regions)`` tuple of ``frozenset``s.
+    """
+    documents, regions = _usage.get(content_type, ((), ()))
+    return frozenset(documents), frozenset(regions)
+
+
+def get_generated_content_types(document):
+    """
+    :return: The concrete content type classes FeinCMS generated for
+             ``document``, keyed by the content type they were made from.
+    :rtype: ``SortedDict``
+    """
+    return _documents[document].generated
@@ -0,0 +1,154 @@
+"""
+Region rendering which goes a little further than FeinCMS'
+``feincms_render_region``.
+
+Content types which set ``render_concurrently = True`` (see
+:py:class:`feincmstools.base.Content`) are rendered on a bounded pool of
+worker threads, so that a region with several slow ``extra_context`` lookups
+takes as long as the slowest of them rather than the sum of all of them. All
+other content is rendered in the calling thread, as usual. Output order is
+always the order of the content in the region.
+
+Workers render in the calling thread's language and time zone. An item's
+``render_timeout`` starts when a worker starts rendering it, not while it
+waits for one; an item still waiting after that long falls back too, and is
+then skipped rather than rendered for nobody.
+"""
+
+import logging
+import threading
+import time
+from multiprocessing import TimeoutError
+
+from django.db import connections
+from django.utils import timezone, translation
+
+from feincms.templatetags.feincms_tags import feincms_render_content
+
+from . import routers
+from .lightweight import fetch_region as fetch_lightweight_region
+from . import settings as feincmstools_settings
+from .utils import get_thread_pool
+
+logger = logging.getLogger(__name__)
+
+
+class _RenderJob(object):
+    """
+    A content item to render on the pool, with the calling thread's
+    language and time zone.
+    """
+
+    def __init__(self, content, request, context):
+        self.content = content
+        self.request = request
+        self.context = context
+        self.language = translation.get_language()
+        self.timezone = timezone.get_current_timezone()
+        self.started = threading.Event()
+        self.started_at = None
+        self.abandoned = False
+
+    def __call__(self):
+        if self.abandoned:
+            return None
+        self.started_at = time.time()
+        self.started.set()
+        if self.language:
+            translation.activate(self.language)
+        timezone.activate(self.timezone)
+        try:
+            return self.content.render(request=self.request, context=self.context)
+        finally:
+            translation.deactivate()
+            timezone.deactivate()
+            # Django connections are per-thread, so anything opened while
+            # rendering belongs to this worker and would otherwise stay open
+            # for the life of the pool.
+            for connection in connections.all():
+                connection.close()
+
+    def get(self, timeout):
+        """
+        The output, waiting at most ``timeout`` seconds for a worker to pick
+        the job up and as long again for it to render.
+        """
+        if not self.started.wait(timeout):
+            raise TimeoutError
+        return self.result.get(max(self.started_at + timeout - time.time(), 0))
+
+
+def _flatten(context):
+    if hasattr(context, 'flatten'):
+        return context.flatten()
+    return dict(context or {})
+
+
+def render_contents(contents, request, context=None):
+    """
+    Render ``contents`` in order and return the joined output.
+
+    Worker threads use their own database connections, so they do not see
+    uncommitted data from the calling thread's transaction.
+    """
+    if context is None:
+        context = {}
+    contents = list(contents)
+    # Batched extra context runs once per content type, in this thread, so
+    # that workers never race to prepare it.
+    for content_type in set(type(c) for c in contents):
+        if hasattr(content_type, 'bulk_extra_context'):
+            content_type.prepare_bulk_extra_context(contents, request)
+
+    pool = None
+    flat_context = None
+    results = []
+    for content in contents:
+        if getattr(content, 'render_concurrently', False):
+            if pool is None:
+                pool = get_thread_pool(
+                    'rendering', feincmstools_settings.RENDER_THREAD_POOL_SIZE)
+                flat_context = _flatten(context)
+            timeout = getattr(content, 'render_timeout', None)
+            if timeout is None:
+                timeout = feincmstools_settings.RENDER_TIMEOUT
+            # ``Content.render`` writes into the context it is given, so each
+            # worker gets a copy of its own.
+            job = _RenderJob(content, request, dict(flat_context))
+            job.result = pool.apply_async(job)
+            results.append((content, job, timeout))
+        else:
+            results.append((content, None, None))
+
+    output = []
+    for content, job, timeout in results:
+        if job is None:
+            output.append(feincms_render_content(context, content, request))
+            continue
+        try:
+            output.append(job.get(timeout))
+        except TimeoutError:
+            job.abandoned = True
+            logger.warning('Timed out rendering %s %s; using its fallback.',
+                           content.__class__.__name__, content.pk)
+            output.append(content.render_fallback(request=request, context=context))
+    return u''.join(o or u'' for o in output)
+
+
+def render_region(feincms_object, region, request, context=None, lightweight=False):
+    """
+    Render the content of ``region`` on ``feincms_object``, the same way as
+    ``{% feincms_render_region %}`` but with concurrent rendering for content
+    types that ask for it. The content is read from the read database, if
+    there is one (see :py:mod:`feincmstools.routers`).
+
+    With ``lightweight=True``, content types with ``render_fields`` are
+    rendered from read-only proxies instead of model instances; see
+    :py:mod:`feincmstools.lightweight`.
+    """
+    with routers.rendering(feincms_object):
+        if lightweight:
+            contents = fetch_lightweight_region(feincms_object, region)
+        else:
+            contents = getattr(feincms_object.content, region)
+    return render_contents(contents, request, context)
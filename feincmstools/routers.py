@@ -0,0 +1,119 @@
+"""
+Read-replica routing for rendering.
+
+With ``FEINCMSTOOLS_READ_DATABASE`` set to a database alias and
+``ReadReplicaRouter`` in ``DATABASE_ROUTERS``, the content of a document
+rendered inside ``rendering(document)`` -- as ``render_region`` and the
+``feincmstools_render_region`` tag do -- is fetched from that database::
+
+    DATABASE_ROUTERS = ['feincmstools.routers.ReadReplicaRouter']
+    FEINCMSTOOLS_READ_DATABASE = 'replica'
+
+A document whose content was saved in the last
+``FEINCMSTOOLS_READ_AFTER_WRITE_WINDOW`` seconds is read from the primary
+instead, so editors see their changes straight away despite replication lag.
+Everything else, including the admin and all writes, uses the primary.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save
+
+from . import settings as feincmstools_settings
+from .signals import content_changed
+
+_local = threading.local()
+
+
+def _written_key(model, pk):
+    return 'feincmstools:written:%s.%s:%s' % (
+        model._meta.app_label, model._meta.object_name.lower(), pk)
+
+
+def mark_written(model, pk):
+    """
+    Read the document of class ``model`` with primary key ``pk`` from the
+    primary for the next ``READ_AFTER_WRITE_WINDOW`` seconds.
+    """
+    if feincmstools_settings.READ_DATABASE:
+        cache.set(_written_key(model, pk), True,
+                  feincmstools_settings.READ_AFTER_WRITE_WINDOW)
+
+
+def recently_written(model, pk):
+    return cache.get(_written_key(model, pk)) is not None
+
+
+def _content_changed(sender, pk, **kwargs):
+    mark_written(sender, pk)
+
+content_changed.connect(_content_changed, dispatch_uid='feincmstools:routers')
+
+
+def _document_saved(sender, instance, **kwargs):
+    mark_written(sender, instance.pk)
+
+
+def connect_signals(model):
+    """
+    Note writes to documents of ``model``. Called for every concrete
+    FeinCMSDocument.
+    """
+    uid = 'feincmstools:routers:%s.%s' % (model.__module__, model.__name__)
+    post_save.connect(_document_saved, sender=model, dispatch_uid=uid)
+
+
+def get_read_database():
+    """
+    :return: The alias content should be read from in this thread, or
+             ``None`` for the usual routing.
+    """
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def rendering(document):
+    """
+    Read content from ``READ_DATABASE`` in the block, unless ``document`` was
+    written recently.
+    """
+    alias = feincmstools_settings.READ_DATABASE
+    if alias and document is not None and recently_written(type(document), document.pk):
+        alias = None
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(alias)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+class ReadReplicaRouter(object):
+    """
+    Sends reads of content types to the read database inside ``rendering()``.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = get_read_database()
+        if alias and hasattr(model, '_feincms_content_class'):
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Objects read from the replica are written to the primary.
+        instance = hints.get('instance')
+        read_database = feincmstools_settings.READ_DATABASE
+        if read_database and instance is not None and instance._state.db == read_database:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        read_database = feincmstools_settings.READ_DATABASE
+        databases = (DEFAULT_DB_ALIAS, read_database)
+        if read_database and obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -8,6 +8,17 @@ PREFIX = 'FEINCMSTOOLS_'
 DEFAULT_SETTINGS = {
     'CONTENT_VIEW_CHOICES': (), # e.g. (('My View', 'myapp.views.myview'),)
     'USE_LEGACY_TABLE_NAMES': False, #Set to True for legacy projects.
+    'RENDER_THREAD_POOL_SIZE': 4, # Workers for content with render_concurrently
+    'RENDER_TIMEOUT': 5, # Seconds before a concurrent render falls back
+    'NAVIGATION_CACHE_TIMEOUT': 60 * 60, # Trees are also invalidated on save
+    'INHERITED_CONTENT_CACHE_TIMEOUT': 0, # Seconds; needs a cache shared by all processes
+    'PREVIEW_THREAD_POOL_SIZE': 2, # Workers generating missing previews
+    'FILE_DELETION_THREAD_POOL_SIZE': 2, # For delete_files_on_delete(deferred=True)
+    'FILE_DELETION_BATCH_SIZE': 100,
+    'READ_DATABASE': None, # Alias to render content from, with ReadReplicaRouter
+    'READ_AFTER_WRITE_WINDOW': 10, # Seconds a saved document is read from the primary
+    'PUBLISH_ROOT': None, # Directory for static pages of documents with publish_static
+    'PUBLISH_HOST': 'testserver', # Host pages are rendered for; must be in ALLOWED_HOSTS
 }
 
 def prefixed(string):
@@ -0,0 +1,69 @@
+"""
+Signals sent by feincmstools.
+
+``content_changed`` is sent whenever content belonging to a FeinCMSDocument
+is saved or deleted. Inside ``defer_content_changed()`` the signal is held
+back and sent once per document when the block exits, which is what the admin
+does when it saves a document's content.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal
+
+#: ``sender`` is the document class, ``pk`` the primary key of the document
+#: whose content changed.
+content_changed = Signal(providing_args=['pk'])
+
+_deferred = threading.local()
+
+
+def notify_content_changed(document_class, pk):
+    pending = getattr(_deferred, 'pending', None)
+    if pending is None:
+        content_changed.send(sender=document_class, pk=pk)
+    elif (document_class, pk) not in pending:
+        pending.append((document_class, pk))
+
+
+def deferring_content_changed():
+    """
+    Whether ``content_changed`` is being held back in this thread.
+    """
+    return getattr(_deferred, 'pending', None) is not None
+
+
+@contextmanager
+def defer_content_changed():
+    """
+    Send ``content_changed`` once per document, after the block has run. If
+    the block raises, nothing is sent.
+    """
+    if deferring_content_changed():
+        # Already deferring further up the stack.
+        yield
+        return
+    _deferred.pending = pending = []
+    try:
+        yield
+    finally:
+        _deferred.pending = None
+    for document_class, pk in pending:
+        content_changed.send(sender=document_class, pk=pk)
+
+
+def _content_saved(sender, instance, **kwargs):
+    notify_content_changed(sender._feincms_content_class, instance.parent_id)
+
+
+def connect_content_type(content_type):
+    """
+    Send ``content_changed`` when content of ``content_type`` is saved or
+    deleted. Called for every content type feincmstools creates.
+    """
+    uid = 'feincmstools:content_changed:%s.%s' % (
+        content_type.__module__, content_type.__name__)
+    post_save.connect(_content_saved, sender=content_type, dispatch_uid=uid)
+    post_delete.connect(_content_saved, sender=content_type, dispatch_uid=uid)
@@ -1,5 +1,8 @@
 (function($) {
     $(document).ready(function() {
+        if (typeof contentblock_init_handlers === 'undefined') {
+            return; // not the item editor
+        }
         contentblock_init_handlers.push(function(){
             for (var content_type in content_type_collapsed_fields) {
                 var collapsed_fields = content_type_collapsed_fields[content_type];
@@ -45,4 +48,158 @@
             }
         });
     });
-})(feincms.jQuery);
+})(window.feincms ? feincms.jQuery : django.jQuery);
+
+/* Lazy inlines in the item editor (FeinCMSDocumentAdmin.lazy_inlines) */
+(function($) {
+    function ensureInline(modvar) {
+        if (!modvar || $('#' + modvar + '_set-group').length) {
+            return;
+        }
+        // The inline has to exist before FeinCMS clones its empty form, so
+        // this request is synchronous.
+        $.ajax({
+            url: '../inline/' + modvar + '/',
+            async: false,
+            success: function(html) {
+                var groups = $('div.feincms_inline');
+                var group = $(html).hide();
+                if (groups.length) {
+                    groups.last().after(group);
+                } else {
+                    $('#main_wrapper').after(group);
+                }
+            }
+        });
+    }
+
+    $(document).ready(function() {
+        if (!window.ItemEditor) {
+            return;
+        }
+        var addContent = ItemEditor.add_content;
+        ItemEditor.add_content = function(type, region) {
+            ensureInline(type);
+            return addContent.apply(this, arguments);
+        };
+        // Runs in the capture phase, i.e. before FeinCMS' own click handler.
+        document.addEventListener('click', function(event) {
+            if ($(event.target).is('input.order-machine-add-button')) {
+                ensureInline($(event.target).prev().val());
+            }
+        }, true);
+    });
+})(django.jQuery);
+
+/* Lazy tree changelist (HierarchicalFeinCMSDocumentAdmin.lazy_tree) */
+(function($) {
+    function descendantRows(pk) {
+        return $('tr.lazy-tree-descendant-of-' + pk);
+    }
+
+    // Gives rows loaded into the changelist what the tree editor and the
+    // admin actions gave the rest of the rows on page load.
+    function initRows(rows) {
+        // The tree editor's plugins live on FeinCMS' own jQuery.
+        var fj = window.feincms ? feincms.jQuery : $;
+        var tbody = $('#result_list tbody');
+
+        var nonEditable = $('.tree-item-not-editable', rows).closest('tr');
+        nonEditable.addClass('non-editable');
+        $('input:checkbox', nonEditable).attr('disabled', 'disabled');
+        $('a:first', nonEditable).click(function(e) { e.preventDefault(); });
+        $('.drag_handle', nonEditable).removeClass('drag_handle');
+
+        // feinTree() expects a page marker in every row, and binds dragging
+        // to every handle on the page.
+        var more = tbody.children('tr.lazy-tree-more').each(function() {
+            $(this).data('lazy-tree-after', $(this).prev());
+        }).detach();
+        fj('div.drag_handle').unbind('mousedown');
+        fj(tbody[0]).feinTree();
+        more.each(function() {
+            $(this).data('lazy-tree-after').after(this);
+        });
+
+        if ($.fn.actions && $('#action-toggle').length) {
+            $('tr input.action-select, #action-toggle').unbind('click');
+            $('div.actions span.question a, div.actions span.clear a').unbind('click');
+            $('form#changelist-form button[name="index"], form#changelist-form input[name="_save"]').unbind('click');
+            // actions() toggles the class of rows that are already selected.
+            $('tr input.action-select:checked').closest('tr').removeClass('selected');
+            $('tr input.action-select').actions();
+        }
+        fj(tbody[0]).recolorRows();
+    }
+
+    function loadChildren(toggle, row, url) {
+        var pk = toggle.data('pk');
+        toggle.addClass('lazy-tree-loading');
+        $.getJSON(url, function(data) {
+            var classes = (row.data('lazy-tree-ancestors') || []).concat([pk]);
+            var insertAfter = descendantRows(pk).last();
+            if (!insertAfter.length) {
+                insertAfter = row;
+            }
+            var rows = $();
+            $.each(data.rows, function(i, node) {
+                var child = $(node.html);
+                child.data('lazy-tree-ancestors', classes);
+                $.each(classes, function(j, ancestor) {
+                    child.addClass('lazy-tree-descendant-of-' + ancestor);
+                });
+                child.addClass('lazy-tree-child-of-' + pk);
+                if (window.feincms && feincms.tree_structure) {
+                    feincms.tree_structure[node.pk] = [];
+                }
+                insertAfter.after(child);
+                insertAfter = child;
+                rows = rows.add(child);
+            });
+            if (data.next_page) {
+                var more = $('<tr>').addClass('lazy-tree-more');
+                $.each(classes, function(j, ancestor) {
+                    more.addClass('lazy-tree-descendant-of-' + ancestor);
+                });
+                more.addClass('lazy-tree-child-of-' + pk);
+                var link = $('<a>').text(data.more_label);
+                link.click(function() {
+                    more.remove();
+                    loadChildren(toggle, row, toggle.data('url') + '?p=' + data.next_page);
+                });
+                more.append($('<td>').attr('colspan', row.children().length).append(link));
+                insertAfter.after(more);
+            }
+            initRows(rows);
+            toggle.removeClass('lazy-tree-loading').addClass('lazy-tree-loaded');
+        });
+    }
+
+    function showChildren(pk) {
+        $('tr.lazy-tree-child-of-' + pk).show().find('.lazy-tree-open').each(function() {
+            showChildren($(this).data('pk'));
+        });
+    }
+
+    $(document).ready(function() {
+        $('#result_list').on('click', '.lazy-tree-toggle', function(event) {
+            event.preventDefault();
+            var toggle = $(this);
+            var pk = toggle.data('pk');
+            if (toggle.hasClass('lazy-tree-loading')) {
+                return;
+            }
+            if (toggle.hasClass('lazy-tree-open')) {
+                toggle.removeClass('lazy-tree-open');
+                descendantRows(pk).hide();
+            } else {
+                toggle.addClass('lazy-tree-open');
+                if (toggle.hasClass('lazy-tree-loaded')) {
+                    showChildren(pk);
+                } else {
+                    loadChildren(toggle, toggle.closest('tr'), toggle.data('url'));
+                }
+            }
+        });
+    });
+})(django.jQuery);
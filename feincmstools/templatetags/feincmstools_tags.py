@@ -4,6 +4,9 @@ from django import template
 
 from feincms.templatetags.feincms_tags import feincms_render_content
 
+from feincmstools.navigation import get_navigation_pages, build_navigation
+from feincmstools.rendering import render_region
+
 register = template.Library()
 
 @register.filter
@@ -23,6 +26,25 @@ def is_parent_of(page1, page2):
             page1.lft < page2.lft and
             page1.rght > page2.rght)
 
+@register.assignment_tag
+def feincmstools_navigation(page, depth=None, root=None):
+    """
+    Return the navigation tree for the model of ``page`` as a list of
+    top-level ``NavigationNode``s, each with ``children``, ``is_current``,
+    ``is_ancestor`` and ``is_selected``. The tree is loaded in one query and
+    cached until a document of that model changes.
+
+    {% feincmstools_navigation feincms_page depth=2 as nav %}
+    {% for node in nav %}
+        <a href="{{ node.page.get_absolute_url }}"{% if node.is_selected %} class="selected"{% endif %}>{{ node.page }}</a>
+        ...
+    {% endfor %}
+
+    Pass ``root`` to limit the tree to the descendants of another document.
+    """
+    pages = get_navigation_pages(type(page), root=root, depth=depth)
+    return build_navigation(pages, current=page)
+
 @register.filter
 def is_equal_or_parent_of(page1, page2):
     return (page1.tree_id == page2.tree_id and
@@ -51,3 +73,21 @@ def get_extension(filename):
 @register.assignment_tag(takes_context=True)
 def feincms_render_content_as(context, content, request=None):
     return feincms_render_content(context, content, request)
+
+
+@register.simple_tag(takes_context=True)
+def feincmstools_render_region(context, feincms_object, region, request=None, lightweight=False):
+    """
+    Like ``feincms_render_region``, but renders content types marked with
+    ``render_concurrently`` on worker threads, and with ``lightweight=True``
+    renders content types with ``render_fields`` from read-only proxies.
+
+    {% feincmstools_render_region feincms_page "main" request %}
+    {% feincmstools_render_region feincms_page "main" request lightweight=True %}
+
+    Without ``request``, the context's ``request`` is used.
+    """
+    # Concurrent content is rendered away from the template's context, so it
+    # needs the request passed in.
+    request = request or context.get('request')
+    return render_region(feincms_object, region, request, context, lightweight)
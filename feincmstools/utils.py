@@ -1,29 +1,309 @@
-from operator import add
-from django.db.models import FileField
+import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import FileField, Q
 from django.db.models.signals import post_delete
 
+from . import settings as feincmstools_settings
+
+logger = logging.getLogger(__name__)
+
 def _get_subclasses(klass):
-    return (klass,) + reduce(add, map(_get_subclasses, klass.__subclasses__()), ())
+    found = [klass]
+    seen = set(found)
+    for klass in found: # grows as we go
+        for subclass in klass.__subclasses__():
+            if subclass not in seen:
+                seen.add(subclass)
+                found.append(subclass)
+    return found
 
 def get_subclasses(model, include_abstract=False):
     """
     Returns a list of unique models that inherit from the specified model. If
     include_abstract is True, abstract inheriting models will also be returned.
     """
-    return list(set([klass for klass in _get_subclasses(model) \
-        if hasattr(klass, '_meta') and (include_abstract or not klass._meta.abstract)]))
+    return [klass for klass in _get_subclasses(model) \
+        if hasattr(klass, '_meta') and (include_abstract or not klass._meta.abstract)]
+
+
+def bulk_update(model, instances, field_names, using=None):
+    """
+    Write the current values of ``field_names`` on ``instances`` back to the
+    database (``using``, if given) with a single UPDATE (one per instance
+    before Django 1.8). No signals are sent and ``save()`` is not called.
+    """
+    instances = list(instances)
+    if not instances:
+        return
+    manager = model._default_manager.db_manager(using)
+    attnames = [model._meta.get_field(name).attname for name in field_names]
+    try:
+        from django.db.models import Case, When, Value
+    except ImportError: # Django < 1.8
+        for instance in instances:
+            manager.filter(pk=instance.pk).update(**dict(
+                (attname, getattr(instance, attname)) for attname in attnames))
+        return
+    values = {}
+    for name, attname in zip(field_names, attnames):
+        values[attname] = Case(
+            *[When(pk=instance.pk, then=Value(getattr(instance, attname)))
+              for instance in instances],
+            output_field=model._meta.get_field(name))
+    manager.filter(pk__in=[i.pk for i in instances]).update(**values)
+
+
+def _after(order_by, values):
+    # Rows which sort after ``values`` when ordered by ``order_by``.
+    query = None
+    for i, name in enumerate(order_by):
+        kwargs = dict(zip(order_by[:i], values[:i]))
+        kwargs['%s__gt' % name] = values[i]
+        query = Q(**kwargs) if query is None else query | Q(**kwargs)
+    return query
+
+
+def iterate_in_chunks(queryset, order_by, chunk_size):
+    """
+    Yield the rows of ``queryset`` in lists of at most ``chunk_size``, ordered
+    by ``order_by``, a sequence of field names which together are unique. Each
+    chunk is fetched with its own query, continuing after the last row of the
+    previous chunk, so memory use does not grow with the size of the table.
+    """
+    order_by = tuple(order_by)
+    queryset = queryset.order_by(*order_by)
+    last = None
+    while True:
+        chunk_queryset = queryset
+        if last is not None:
+            chunk_queryset = queryset.filter(_after(order_by, last))
+        chunk = list(chunk_queryset[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = [getattr(chunk[-1], name) for name in order_by]
+
+
+def model_cache_key(prefix, model):
+    return '%s:%s.%s' % (prefix, model._meta.app_label,
+                         model._meta.object_name.lower())
+
+
+def get_cache_versions(keys):
+    """
+    :return: A ``dict`` of the versions stored in the cache under ``keys``.
+             Keys without a version (e.g. after the cache was cleared) get
+             the current time, in milliseconds, as their version now.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, now, None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def get_cache_version(key):
+    return get_cache_versions([key])[key]
+
+
+def bump_cache_version(key):
+    """
+    Move the version under ``key`` on, so that anything cached under the old
+    version is no longer looked up.
+    """
+    version = cache.get(key) or 0
+    cache.set(key, max(int(time.time() * 1000), version + 1), None)
+
+
+_thread_pools = {}
+_thread_pools_lock = threading.Lock()
+
+
+def get_thread_pool(name, size):
+    """
+    The process-wide ``ThreadPool`` called ``name``, started with ``size``
+    threads the first time it is asked for.
+    """
+    with _thread_pools_lock:
+        if name not in _thread_pools:
+            _thread_pools[name] = ThreadPool(size)
+        return _thread_pools[name]
+
+
+def _install_commit_hooks(connection):
+    """
+    Give a Django < 1.9 connection the ``run_on_commit`` list of later
+    versions, by wrapping its transaction methods the way Django 1.9 changed
+    them. Connections belong to one thread, so this is done per connection.
+    """
+    if 'run_on_commit' in connection.__dict__:
+        return
+    connection.run_on_commit = [] # (savepoint ids, func)
+    connection.run_commit_hooks_on_set_autocommit_on = False
+    commit = connection.commit
+    rollback = connection.rollback
+    savepoint_rollback = connection.savepoint_rollback
+    set_autocommit = connection.set_autocommit
+    close = connection.close
+
+    def run_commit_hooks():
+        hooks, connection.run_on_commit = connection.run_on_commit, []
+        connection.run_commit_hooks_on_set_autocommit_on = False
+        for sids, func in hooks:
+            func()
+
+    def _commit():
+        commit()
+        if connection.in_atomic_block:
+            return
+        if connection.features.autocommits_when_autocommit_is_off:
+            # atomic() never calls set_autocommit(True) on these backends.
+            run_commit_hooks()
+        else:
+            connection.run_commit_hooks_on_set_autocommit_on = True
+
+    def _set_autocommit(autocommit, *args, **kwargs):
+        set_autocommit(autocommit, *args, **kwargs)
+        if autocommit and connection.run_commit_hooks_on_set_autocommit_on:
+            run_commit_hooks()
+
+    def _rollback():
+        connection.run_on_commit = []
+        connection.run_commit_hooks_on_set_autocommit_on = False
+        rollback()
+
+    def _savepoint_rollback(sid):
+        savepoint_rollback(sid)
+        connection.run_on_commit = [(sids, func) for sids, func
+                                    in connection.run_on_commit if sid not in sids]
+
+    def _close():
+        if connection.in_atomic_block:
+            connection.run_on_commit = []
+        close()
+
+    connection.commit = _commit
+    connection.rollback = _rollback
+    connection.savepoint_rollback = _savepoint_rollback
+    connection.set_autocommit = _set_autocommit
+    connection.close = _close
+
+
+def on_commit(func, using=None):
+    """
+    Call ``func`` once the current transaction on ``using`` commits, straight
+    away outside a transaction, and never if it is rolled back (or the
+    savepoint it was registered in is). This is ``transaction.on_commit``
+    where Django has it (1.9+), and a backport of it otherwise.
+    """
+    if hasattr(transaction, 'on_commit'):
+        transaction.on_commit(func, using=using)
+        return
+    connection = transaction.get_connection(using)
+    _install_commit_hooks(connection)
+    if connection.in_atomic_block:
+        connection.run_on_commit.append((set(connection.savepoint_ids), func))
+    elif not connection.get_autocommit():
+        raise transaction.TransactionManagementError(
+            'on_commit() cannot be used in manual transaction management')
+    else:
+        func()
+
+
+def get_commit_hooks(using=None):
+    """
+    :return: The functions waiting for the current transaction on ``using``
+             to commit.
+    """
+    connection = transaction.get_connection(using)
+    return [func for sids, func in connection.__dict__.get('run_on_commit', ())]
+
+
+def _get_files(instance):
+    return [getattr(instance, field.name) for field in instance._meta.fields
+            if isinstance(field, FileField) and getattr(instance, field.name)]
 
 
 def _delete_files(sender, instance=None, **kwargs):
     if instance:
-        for file_field in [field.name
-                for field in instance._meta.fields
-                if isinstance(field, FileField)
-                and getattr(instance, field.name)]:
-            print file_field, getattr(instance, file_field).path
-            getattr(instance, file_field).delete(save=False)
+        for field_file in _get_files(instance):
+            logger.debug('Deleting %s', field_file.name)
+            field_file.delete(save=False)
+
+
+def delete_stored_files(files):
+    """
+    Delete ``files``, a list of ``(storage, name)`` pairs, logging (rather
+    than raising) any failures.
+    """
+    for storage, name in files:
+        try:
+            storage.delete(name)
+            logger.debug('Deleted %s', name)
+        except Exception:
+            logger.exception('Could not delete %s', name)
+
+
+class _FileDeletionBatch(object):
+    """
+    Files from one transaction (or savepoint), deleted once it commits.
+    """
+
+    def __init__(self, batches, key):
+        self.files = []
+        self.batches = batches
+        self.key = key
+
+    def discard(self):
+        if self.batches.get(self.key) is self:
+            del self.batches[self.key]
+
+    def flush(self):
+        self.discard()
+        files, self.files = self.files, []
+        size = feincmstools_settings.FILE_DELETION_BATCH_SIZE
+        pool = get_thread_pool(
+            'file-deletion', feincmstools_settings.FILE_DELETION_THREAD_POOL_SIZE)
+        for i in range(0, len(files), size):
+            pool.apply_async(delete_stored_files, (files[i:i + size],))
 
-def delete_files_on_delete(model):
+
+def _queue_files(sender, instance=None, using=None, **kwargs):
+    if not instance:
+        return
+    files = [(f.storage, f.name) for f in _get_files(instance)]
+    if not files:
+        return
+    # One batch per transaction and savepoint, so that rolling back a
+    # savepoint also drops the deletions queued inside it.
+    connection = transaction.get_connection(using)
+    batches = connection.__dict__.setdefault('_feincmstools_file_batches', {})
+    key = tuple(connection.savepoint_ids)
+    queued = set(getattr(func, '__self__', None)
+                 for func in get_commit_hooks(using))
+    # Batches whose transaction was rolled back will never be flushed.
+    for stale in [b for b in batches.values() if b not in queued]:
+        stale.discard()
+    batch = batches.get(key)
+    if batch is None:
+        batch = batches[key] = _FileDeletionBatch(batches, key)
+        batch.files.extend(files)
+        # Outside a transaction this flushes straight away.
+        on_commit(batch.flush, using=using)
+    else:
+        batch.files.extend(files)
+
+
+def delete_files_on_delete(model, deferred=False):
     """
     A convenience function to delete any files referred to by File/Image fields
     in a model when an instance or subclass of that model is deleted.
@@ -34,7 +314,13 @@ def delete_files_on_delete(model):
     
     This function is only useful in Django 1.2.5 and later. Previous versions
     have this behaviour built-in.
+
+    With ``deferred=True``, files are not deleted while the instance is, but
+    queued and deleted in batches on a pool of worker threads once the
+    transaction commits (see ``on_commit``). Nothing is deleted if the
+    transaction is rolled back.
     """
+    handler = _queue_files if deferred else _delete_files
     for klass in get_subclasses(model):
         if any(isinstance(field, FileField) for field in klass._meta.fields):
-            post_delete.connect(_delete_files, sender=klass)
+            post_delete.connect(handler, sender=klass)